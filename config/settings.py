@@ -3,4 +3,80 @@ settings.py - 全局配置文件
 """
 
 # 示例配置
-API_URL = "https://api.example.com" 
\ No newline at end of file
+API_URL = "https://api.example.com"
+
+# HTTP连接池配置
+HTTP_POOL_CONNECTIONS = 8  # 每个host缓存的连接池数量
+HTTP_POOL_MAXSIZE = 32  # 每个连接池保持的最大keep-alive连接数
+HTTP_TIMEOUT = (10, 30)  # 默认超时（连接超时, 读取超时），单位秒
+
+# 上传配置
+UPLOAD_SLICE_CONCURRENCY = 3  # 单个文件同时在途的分片数
+UPLOAD_SLICE_MAX_RETRY = 3  # 单个分片最大尝试次数
+UPLOAD_RETRY_BACKOFF = 1  # 重试退避基数（秒），按2的幂递增
+UPLOAD_DEFAULT_SLICE_SIZE = 16 * 1024 * 1024  # 预计算分片MD5时使用的分片大小，与服务端默认sliceSize一致
+UPLOAD_MAX_ACTIVE_TASKS = 3  # 同时执行的上传任务数（工作线程数）
+UPLOAD_HASH_CONCURRENCY = 1  # 同时读盘计算哈希的任务数
+UPLOAD_NETWORK_CONCURRENCY = 8  # 所有任务合计同时在途的分片请求数
+UPLOAD_SCHEDULE_POLICY = 'small_first'  # 排队顺序：small_first小文件优先，fifo按添加顺序
+UPLOAD_JOURNAL_SAVE_INTERVAL = 2  # 分片完成记录的最小写盘间隔（秒），暂停、失败时立即写盘
+
+# 本地缓存配置
+HASH_CACHE_MAX_ENTRIES = 20000  # 本地哈希缓存最多保留的文件数，超出按最近使用时间淘汰
+METADATA_REVALIDATE_AFTER = 300  # 本地目录镜像超过该秒数未列举时，打开文件夹先显示镜像再后台刷新
+
+# 下载配置
+DOWNLOAD_SEGMENTS = 4  # 单个文件的最大并发区间数
+DOWNLOAD_MIN_SEGMENT_SIZE = 4 * 1024 * 1024  # 每个区间的最小字节数，小文件不分段
+DOWNLOAD_CHUNK_SIZE = 256 * 1024  # 每次从连接读取的字节数
+DOWNLOAD_STATE_SAVE_INTERVAL = 1  # 断点续传进度记录的最小写盘间隔（秒）
+TASKS_SAVE_INTERVAL = 2  # 仅进度变化时，下载任务列表文件的最小写盘间隔（秒）
+DOWNLOAD_MAX_ACTIVE_TASKS = 3  # 同时执行的下载任务数（工作线程数）
+DOWNLOAD_MAX_CONNECTIONS_PER_HOST = 8  # 所有下载合计对同一host的最大连接数
+DOWNLOAD_BANDWIDTH_LIMIT = 0  # 全局下载限速（字节/秒），0为不限速
+FOLDER_CRAWL_CONCURRENCY = 4  # 下载文件夹时同时遍历的子文件夹数
+FOLDER_CRAWL_PAGE_SIZE = 100  # 遍历文件夹时每页获取的条目数
+DOWNLOAD_URL_RESOLVE_CONCURRENCY = 4  # 同时获取下载地址的请求数
+DOWNLOAD_URL_CACHE_TTL = 300  # 无法从地址解析过期时间时的缓存时长（秒）
+DOWNLOAD_URL_EXPIRY_MARGIN = 60  # 距离过期不足该秒数的缓存地址视为已过期
+
+# 离线任务配置
+OFFLINE_POLL_CONCURRENCY = 4  # 同时查询离线任务进度的请求数
+OFFLINE_POLL_MIN_INTERVAL = 1  # 单个任务两次查询的最短间隔（秒）
+OFFLINE_POLL_MAX_INTERVAL = 60  # 进度长时间不变时查询间隔的上限（秒）
+OFFLINE_POLL_STEP = 5  # 按进度速率估算下次查询时间时，期望两次查询之间推进的百分点
+OFFLINE_SUBMIT_CONCURRENCY = 4  # 批量推送离线链接时同时在途的请求数
+OFFLINE_SUBMIT_MAX_RETRY = 3  # 单个链接遇到网络错误时的最大尝试次数
+
+# 接口限流配置
+# 各接口族（按路径前缀匹配，最长前缀优先）每秒最多请求数，未列出的路径不限速
+API_RATE_LIMITS = {
+    "/api/v1/access_token": 1,
+    "/api/v2/file/list": 10,
+    "/api/v1/file/list": 5,
+    "/api/v1/file/detail": 10,
+    "/api/v1/file/download_info": 5,
+    "/api/v1/file/name": 5,
+    "/api/v1/file/rename": 5,
+    "/api/v1/file/move": 5,
+    "/api/v1/file/trash": 5,
+    "/api/v1/file/recover": 5,
+    "/api/v1/file/delete": 5,
+    "/api/v1/offline/download": 5,
+    "/api/v1/offline/download/process": 5,
+    "/upload/v1/file/mkdir": 5,
+    "/upload/v2/file/create": 5,
+    "/upload/v2/file/upload_complete": 5,
+    "/upload/v2/file/domain": 5,
+}
+API_MAX_RETRY = 5  # 遇到限流（HTTP 429、频繁提示）或GET请求5xx时的最大重试次数
+API_RETRY_BACKOFF = 0.5  # 重试退避基数（秒），按2的幂递增并加随机抖动
+API_RETRY_MAX_DELAY = 8  # 单次退避等待的上限（秒）
+UPLOAD_VERIFY_POLL_MAX_DELAY = 2  # 上传校验中轮询的最大等待间隔（秒）
+
+# 文件操作配置
+RENAME_BATCH_SIZE = 30  # 批量重命名接口单次最多包含的文件数
+RENAME_BATCH_CONCURRENCY = 3  # 同时提交的批量重命名请求数
+BULK_CHUNK_SIZE = 100  # 移动、删除、恢复等接口单次请求最多包含的文件ID数
+BULK_CONCURRENCY = 3  # 批量文件操作同时提交的请求数
+BULK_CHUNK_MAX_RETRY = 3  # 单个分块请求失败时的最大尝试次数
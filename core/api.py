@@ -3,14 +3,17 @@ api.py - API相关逻辑
 """
 
 # 这里实现API相关的函数和类 
-import requests
+from .http_client import get_http_client
 
 class Pan123Api:
     BASE_URL = "https://open-api.123pan.com"
 
+    def __init__(self, http=None):
+        self.http = http or get_http_client()
+
     def get_token_by_credentials(self, client_id, client_secret):
         url = f"{self.BASE_URL}/api/v1/access_token"
-        resp = requests.post(url, json={
+        resp = self.http.post(url, json={
             "clientID": client_id,
             "clientSecret": client_secret
         }, headers={"Platform": "open_platform"})
@@ -33,7 +36,7 @@ class Pan123Api:
             "Platform": "open_platform",
             "Authorization": f"Bearer {token}"
         }
-        resp = requests.post(url, json=payload, headers=headers)
+        resp = self.http.post(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0 and data.get("data", {}).get("taskID"):
             return data["data"]["taskID"]
@@ -46,7 +49,7 @@ class Pan123Api:
             "Platform": "open_platform",
             "Authorization": f"Bearer {token}"
         }
-        resp = requests.get(url, headers=headers)
+        resp = self.http.get(url, headers=headers)
         return resp.json()
 
     def create_directory(self, token, name, parent_id):
@@ -57,7 +60,7 @@ class Pan123Api:
             "Platform": "open_platform",
             "Authorization": f"Bearer {token}"
         }
-        resp = requests.post(url, json=payload, headers=headers)
+        resp = self.http.post(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0 and data.get("data", {}).get("dirID"):
             return data["data"]["dirID"]
@@ -65,7 +68,7 @@ class Pan123Api:
 
     def get_actual_download_url(self, url):
         try:
-            resp = requests.head(url, allow_redirects=True)
+            resp = self.http.head(url, allow_redirects=True)
             return resp.url
         except Exception:
             return url
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+bulk_ops.py - 批量文件操作：按服务端上限分块、并发提交并汇总每个ID的结果
+"""
+
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .rate_limiter import backoff_delay, is_throttle_message
+from config.settings import BULK_CHUNK_SIZE, BULK_CONCURRENCY, BULK_CHUNK_MAX_RETRY
+
+# 登录失效类提示，与具体文件无关
+AUTH_MESSAGES = ("token", "Token", "授权", "登录", "401")
+
+def is_systemic_error(error):
+    """
+    判断错误是否与具体文件无关（网络异常、限流、登录失效、服务端返回非JSON），
+    这类错误拆分请求也无济于事，只会成倍增加请求
+    """
+    if isinstance(error, (requests.RequestException, ValueError)):
+        return True
+    message = str(error)
+    return is_throttle_message(message) or any(k in message for k in AUTH_MESSAGES)
+
+def run_chunked(func, ids, chunk_size=BULK_CHUNK_SIZE, max_workers=BULK_CONCURRENCY, max_retry=BULK_CHUNK_MAX_RETRY):
+    """
+    把ids按chunk_size分块，并发调用func(chunk)，失败的块退避后重试；
+    重试仍失败、且错误与具体文件有关的块对半拆分再提交，直到找出具体是哪些ID失败；
+    拆分途中遇到与具体文件无关的错误（网络、限流、登录失效）时，该部分整体记为失败
+    :param func: 处理一块ID的函数，失败时抛出异常
+    :return: dict，ID -> None（成功）或错误信息
+    """
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+
+    def try_once(chunk):
+        """提交一次，成功返回None，失败返回异常"""
+        try:
+            func(chunk)
+            return None
+        except Exception as e:
+            return e
+
+    def fail(chunk, error):
+        return {file_id: str(error) or '操作失败' for file_id in chunk}
+
+    def bisect(chunk, error):
+        if len(chunk) == 1:
+            return fail(chunk, error)
+        half = len(chunk) // 2
+        halves = [chunk[:half], chunk[half:]]
+        results = {}
+        for part in halves:
+            e = try_once(part)
+            if e is None:
+                results.update({file_id: None for file_id in part})
+            elif is_systemic_error(e):
+                results.update(fail(part, e))
+            else:
+                results.update(bisect(part, e))
+        return results
+
+    def run_one(chunk):
+        error = None
+        for attempt in range(max_retry):
+            error = try_once(chunk)
+            if error is None:
+                return {file_id: None for file_id in chunk}
+            if attempt + 1 < max_retry:
+                time.sleep(backoff_delay(attempt))
+        if is_systemic_error(error):
+            return fail(chunk, error)
+        return bisect(chunk, error)
+
+    results = {}
+    if not chunks:
+        return results
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        for chunk_results in executor.map(run_one, chunks):
+            results.update(chunk_results)
+    return results
+
+def failed_ids(results):
+    """返回失败的ID及错误信息"""
+    return {file_id: error for file_id, error in results.items() if error}
+
+def succeeded_ids(results):
+    """返回成功的ID，保持原有顺序"""
+    return [file_id for file_id, error in results.items() if not error]
+
+def summarize(action, results):
+    """生成给用户看的结果摘要，如“删除完成：成功98个，失败2个（文件不存在）”"""
+    failed = failed_ids(results)
+    text = f"{action}完成：成功{len(results) - len(failed)}个，失败{len(failed)}个"
+    if failed:
+        errors = sorted(set(failed.values()))
+        text += "（" + "；".join(errors[:3]) + ("…" if len(errors) > 3 else "") + "）"
+    return text
@@ -0,0 +1,216 @@
+"""
+downloader.py - 分段并发下载
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from .http_client import get_http_client
+from .rate_limiter import TokenBucket
+from config.settings import (
+    DOWNLOAD_SEGMENTS, DOWNLOAD_MIN_SEGMENT_SIZE, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_STATE_SAVE_INTERVAL,
+    DOWNLOAD_MAX_CONNECTIONS_PER_HOST, DOWNLOAD_BANDWIDTH_LIMIT
+)
+
+class SegmentedDownloader:
+    """
+    探测Content-Length和Range支持后，把文件切成多个字节区间并发下载，
+    各区间写入预分配文件的对应位置；服务端不支持Range时退化为单连接下载。
+    下载过程中数据写入 <文件名>.part，各区间进度和校验信息（ETag/Last-Modified）
+    记录在 <文件名>.part.json，中断后再次下载会从已完成的位置继续。
+    同一实例上的所有下载共享每个host的连接数上限和全局带宽限制
+    """
+
+    def __init__(self, http=None, segments=DOWNLOAD_SEGMENTS, min_segment_size=DOWNLOAD_MIN_SEGMENT_SIZE, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                 max_connections_per_host=DOWNLOAD_MAX_CONNECTIONS_PER_HOST, bandwidth_limit=DOWNLOAD_BANDWIDTH_LIMIT):
+        self.http = http or get_http_client()
+        self.segments = segments
+        self.min_segment_size = min_segment_size
+        self.chunk_size = chunk_size
+        self.max_connections_per_host = max_connections_per_host
+        self._host_slots = {}  # host -> 连接数信号量
+        self._host_lock = threading.Lock()
+        # 全局带宽令牌桶，单位字节/秒，0为不限速
+        self.bandwidth = TokenBucket(bandwidth_limit)
+
+    def set_bandwidth_limit(self, bytes_per_second):
+        """设置全局下载限速（字节/秒），0为不限速"""
+        self.bandwidth.set_rate(bytes_per_second)
+
+    @contextmanager
+    def _connection_slot(self, url):
+        """占用目标host的一个连接名额"""
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            slots = self._host_slots.get(host)
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.max_connections_per_host)
+                self._host_slots[host] = slots
+        with slots:
+            yield
+
+    def probe(self, url):
+        """
+        用Range: bytes=0-0请求探测文件大小、是否支持分段和校验信息
+        :return: (文件大小, 是否支持Range, {"etag": ..., "last_modified": ...})，大小未知时为0
+        """
+        with self._connection_slot(url), self.http.get(url, headers={"Range": "bytes=0-0"}, stream=True) as r:
+            r.raise_for_status()
+            validator = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+            if r.status_code == 206:
+                match = re.search(r"/(\d+)$", r.headers.get("Content-Range", ""))
+                if match:
+                    return int(match.group(1)), True, validator
+            return int(r.headers.get("Content-Length", 0) or 0), False, validator
+
+    def split_ranges(self, total):
+        """把[0, total)切分成若干区间，返回[(start, end)]，end为闭区间"""
+        count = max(1, min(self.segments, total // self.min_segment_size))
+        size = total // count
+        ranges = []
+        for i in range(count):
+            start = i * size
+            end = total - 1 if i == count - 1 else start + size - 1
+            ranges.append((start, end))
+        return ranges
+
+    @staticmethod
+    def discard_partial(local_path):
+        """删除未完成的.part文件和进度记录"""
+        for path in (local_path + ".part", local_path + ".part.json"):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _load_state(state_path, total, validator):
+        """读取进度记录，文件大小或校验信息变化时返回None（需要重新下载）"""
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except Exception:
+            return None
+        if state.get("total") != total:
+            return None
+        saved = state.get("validator") or {}
+        for key in ("etag", "last_modified"):
+            if saved.get(key) and validator.get(key) and saved[key] != validator[key]:
+                return None
+        return state.get("segments")
+
+    @staticmethod
+    def _save_state(state_path, total, validator, segments):
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"total": total, "validator": validator, "segments": segments}, f)
+        os.replace(tmp_path, state_path)
+
+    def download(self, url, local_path, progress_callback=None, should_stop=None):
+        """
+        下载url到local_path，存在未完成的.part文件时断点续传
+        :param progress_callback: 可选，progress_callback(已下载字节, 总字节)
+        :param should_stop: 可选，返回True时尽快中止，已下载部分保留
+        :return: True表示下载完成，False表示被中止
+        """
+        part_path = local_path + ".part"
+        state_path = part_path + ".json"
+        total, accept_ranges, validator = self.probe(url)
+        if not accept_ranges or not total:
+            # 不支持Range无法续传，只能从头下载
+            self.discard_partial(local_path)
+            completed = self._download_single(url, part_path, total, progress_callback, should_stop)
+        else:
+            segments = self._load_state(state_path, total, validator) if os.path.exists(part_path) else None
+            if segments is None:
+                # 预分配文件，各区间按偏移写入；每个区间记录[起点, 终点, 已完成字节]
+                with open(part_path, "wb") as f:
+                    f.truncate(total)
+                segments = [[start, end, 0] for start, end in self.split_ranges(total)]
+                self._save_state(state_path, total, validator, segments)
+            completed = self._download_segments(url, part_path, state_path, total, validator, segments, progress_callback, should_stop)
+        if completed:
+            os.replace(part_path, local_path)
+            if os.path.exists(state_path):
+                os.remove(state_path)
+        return completed
+
+    def _download_segments(self, url, part_path, state_path, total, validator, segments, progress_callback=None, should_stop=None):
+        """并发下载各区间中未完成的部分"""
+        lock = threading.Lock()
+        state = {"downloaded": sum(seg[2] for seg in segments), "error": None, "saved_at": time.time()}
+
+        def save(force=False):
+            # 调用方持有lock；按时间节流写盘
+            now = time.time()
+            if force or now - state["saved_at"] >= DOWNLOAD_STATE_SAVE_INTERVAL:
+                self._save_state(state_path, total, validator, segments)
+                state["saved_at"] = now
+
+        def fetch(seg):
+            start, end = seg[0] + seg[2], seg[1]
+            if start > end:
+                return
+            try:
+                headers = {"Range": f"bytes={start}-{end}"}
+                with self._connection_slot(url), self.http.get(url, headers=headers, stream=True) as r, open(part_path, "r+b") as f:
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise RuntimeError(f"服务端未按区间返回数据: HTTP {r.status_code}")
+                    f.seek(start)
+                    for chunk in r.iter_content(chunk_size=self.chunk_size):
+                        if state["error"] or (should_stop and should_stop()):
+                            return
+                        if chunk:
+                            chunk = chunk[:end - seg[0] - seg[2] + 1]
+                            self.bandwidth.consume(len(chunk))
+                            f.write(chunk)
+                            # 先落盘再记录进度，保证记录的字节都已写入文件
+                            f.flush()
+                            with lock:
+                                seg[2] += len(chunk)
+                                state["downloaded"] += len(chunk)
+                                downloaded = state["downloaded"]
+                                save()
+                            if progress_callback:
+                                progress_callback(downloaded, total)
+            except Exception as e:
+                with lock:
+                    if not state["error"]:
+                        state["error"] = e
+
+        threads = [threading.Thread(target=fetch, args=(seg,), daemon=True) for seg in segments]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        with lock:
+            save(force=True)
+        if state["error"]:
+            raise state["error"]
+        if should_stop and should_stop():
+            return False
+        return all(seg[0] + seg[2] > seg[1] for seg in segments)
+
+    def _download_single(self, url, local_path, total, progress_callback=None, should_stop=None):
+        """单连接顺序下载"""
+        with self._connection_slot(url), self.http.get(url, stream=True) as r:
+            r.raise_for_status()
+            total = int(r.headers.get("Content-Length", 0) or 0) or total
+            downloaded = 0
+            with open(local_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
+                    if should_stop and should_stop():
+                        return False
+                    if chunk:
+                        self.bandwidth.consume(len(chunk))
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        if progress_callback:
+                            progress_callback(downloaded, total)
+        return True
@@ -1,8 +1,13 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from .http_client import get_http_client
+from .bulk_ops import run_chunked
 
 class FileApi:
     BASE_URL = "https://open-api.123pan.com"
 
+    def __init__(self, http=None):
+        self.http = http or get_http_client()
+
     def get_file_list(self, token, parent_file_id=0, limit=100, search_data=None, search_mode=None, last_file_id=None):
         url = f"{self.BASE_URL}/api/v2/file/list"
         headers = {
@@ -20,9 +25,37 @@ class FileApi:
             params["searchMode"] = search_mode
         if last_file_id is not None:
             params["lastFileId"] = last_file_id
-        resp = requests.get(url, headers=headers, params=params)
+        resp = self.http.get(url, headers=headers, params=params)
         return resp.json()
 
+    def iter_directory(self, token, parent_id=0, page_size=100, include_trashed=False):
+        """
+        逐条返回目录下的条目：按lastFileId翻页直到最后一页，默认过滤回收站中的条目；
+        调用方处理当前页时，后台线程已在获取下一页
+        """
+        def fetch(last_file_id):
+            resp = self.get_file_list(token, parent_file_id=parent_id, limit=page_size, last_file_id=last_file_id)
+            if resp.get("code", 0) != 0:
+                raise Exception(resp.get("message", "获取文件列表失败"))
+            return resp.get("data") or {}
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            future = executor.submit(fetch, None)
+            while future is not None:
+                data = future.result()
+                entries = data.get("fileList") or []
+                # lastFileId为-1表示已是最后一页
+                last_file_id = data.get("lastFileId", -1)
+                future = None
+                if entries and last_file_id not in (None, -1):
+                    future = executor.submit(fetch, last_file_id)
+                for f in entries:
+                    if include_trashed or f.get('trashed', 0) == 0:
+                        yield f
+        finally:
+            executor.shutdown(wait=False)
+
     def get_trash_files(self, token, page=1, limit=100, order_by="file_id", order_direction="desc"):
         """使用旧版API获取回收站文件"""
         url = f"{self.BASE_URL}/api/v1/file/list"
@@ -41,7 +74,7 @@ class FileApi:
         }
         
         try:
-            resp = requests.get(url, headers=headers, params=params)
+            resp = self.http.get(url, headers=headers, params=params)
             
             if resp.status_code != 200:
                 return {"code": -1, "message": f"HTTP错误: {resp.status_code}", "data": {}}
@@ -68,7 +101,7 @@ class FileApi:
             
         
         try:
-            resp = requests.get(url, headers=headers, params=params)
+            resp = self.http.get(url, headers=headers, params=params)
             
             if resp.status_code != 200:
                 return {"code": -1, "message": f"HTTP错误: {resp.status_code}", "data": {}}
@@ -84,6 +117,9 @@ class FileApi:
             return json_data
         except Exception as e:
             return {"code": -1, "message": f"请求异常: {str(e)}", "data": {}}
+
+    def create_directory(self, token, name, parent_id):
+        """创建目录，返回新目录的ID"""
         url = f"{self.BASE_URL}/upload/v1/file/mkdir"
         headers = {
             "Content-Type": "application/json",
@@ -94,7 +130,7 @@ class FileApi:
             "name": name,
             "parentID": parent_id
         }
-        resp = requests.post(url, json=payload, headers=headers)
+        resp = self.http.post(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0 and data.get("data", {}).get("dirID"):
             return data["data"]["dirID"]
@@ -111,13 +147,14 @@ class FileApi:
             "fileId": file_id,
             "fileName": file_name
         }
-        resp = requests.put(url, json=payload, headers=headers)
+        resp = self.http.put(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0:
             return True
         raise Exception(data.get("message", "重命名失败"))
 
     def batch_rename_files(self, token, rename_list):
+        """批量重命名，rename_list为["文件ID|新文件名", ...]，每次最多RENAME_BATCH_SIZE个"""
         url = f"{self.BASE_URL}/api/v1/file/rename"
         headers = {
             "Content-Type": "application/json",
@@ -127,7 +164,7 @@ class FileApi:
         payload = {
             "renameList": rename_list
         }
-        resp = requests.post(url, json=payload, headers=headers)
+        resp = self.http.post(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0:
             return True
@@ -143,7 +180,7 @@ class FileApi:
         payload = {
             "fileIDs": file_ids
         }
-        resp = requests.post(url, json=payload, headers=headers)
+        resp = self.http.post(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0:
             return True
@@ -160,7 +197,7 @@ class FileApi:
             "fileIDs": file_ids,
             "toParentFileID": to_parent_file_id
         }
-        resp = requests.post(url, json=payload, headers=headers)
+        resp = self.http.post(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0:
             return True
@@ -174,7 +211,7 @@ class FileApi:
             "Authorization": f"Bearer {token}"
         }
         params = {"fileId": file_id}
-        resp = requests.get(url, headers=headers, params=params)
+        resp = self.http.get(url, headers=headers, params=params)
         data = resp.json()
         if data.get("code") == 0 and data.get("data", {}).get("downloadUrl"):
             return data["data"]["downloadUrl"]
@@ -191,7 +228,7 @@ class FileApi:
         payload = {
             "fileIDs": file_ids
         }
-        resp = requests.post(url, json=payload, headers=headers)
+        resp = self.http.post(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0:
             return True
@@ -208,8 +245,21 @@ class FileApi:
         payload = {
             "fileIDs": file_ids
         }
-        resp = requests.post(url, json=payload, headers=headers)
+        resp = self.http.post(url, json=payload, headers=headers)
         data = resp.json()
         if data.get("code") == 0:
             return True
-        raise Exception(data.get("message", "彻底删除文件失败")) 
\ No newline at end of file
+        raise Exception(data.get("message", "彻底删除文件失败"))
+
+    # 以下批量方法把大量ID分块并发提交，返回 {文件ID: None（成功）或错误信息}
+    def bulk_move_to_trash(self, token, file_ids):
+        return run_chunked(lambda ids: self.move_to_trash(token, ids), file_ids)
+
+    def bulk_move_files(self, token, file_ids, to_parent_file_id):
+        return run_chunked(lambda ids: self.move_files(token, ids, to_parent_file_id), file_ids)
+
+    def bulk_recover_files(self, token, file_ids):
+        return run_chunked(lambda ids: self.recover_file(token, ids), file_ids)
+
+    def bulk_delete_permanently(self, token, file_ids):
+        return run_chunked(lambda ids: self.delete_file_permanently(token, ids), file_ids) 
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+file_columns.py - 文件列表的列式存储
+"""
+
+import os
+import re
+from array import array
+from datetime import datetime
+
+_DIGITS = re.compile(r'(\d+)')
+
+def natural_key(name):
+    """文件名的自然排序键：忽略大小写，数字按数值比较（file2排在file10前面）"""
+    parts = _DIGITS.split(name.casefold())
+    # split的结果中偶数位是文本、奇数位是数字，同一位置的类型总是一致
+    parts[1::2] = [int(p) for p in parts[1::2]]
+    return tuple(parts)
+
+def parse_time(text):
+    """把创建时间解析为时间戳，无法解析的排在最前面"""
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except (TypeError, ValueError, OverflowError, OSError):
+        return 0.0
+
+class FileColumns:
+    """
+    文件列表的列式存储：每个显示字段一列（ID、大小用整数数组，类型用bytearray），
+    表格按行号直接读取，不为每个单元格创建对象。
+    records保留原始的文件信息字典（不复制），供重命名、删除等操作使用；positions为文件ID到下标的索引。
+    排序键每列只在第一次按该列排序时计算一次，之后的排序直接使用
+    """
+
+    def __init__(self, files=()):
+        self.load(files)
+
+    def load(self, files):
+        self.records = []
+        self.positions = {}
+        self.ids = array('q')
+        self.sizes = array('q')
+        self.types = bytearray()
+        self.statuses = array('l')
+        self.names = []
+        self.create_ats = []
+        self._sort_keys = {}  # 列号 -> 排序键列表
+        for file_info in files:
+            self.append(file_info)
+
+    def __len__(self):
+        return len(self.records)
+
+    def append(self, file_info):
+        """追加一个文件，返回它在存储中的下标"""
+        self.records.append(file_info)
+        self.ids.append(int(file_info.get('fileId', 0)))
+        self.positions[self.ids[-1]] = len(self.records) - 1
+        self.sizes.append(int(file_info.get('size') or 0))
+        self.types.append(1 if file_info.get('type') == 1 else 0)
+        self.statuses.append(int(file_info.get('status') or 0))
+        self.names.append(file_info.get('filename', ''))
+        self.create_ats.append(file_info.get('createAt', '') or '')
+        i = len(self.records) - 1
+        for column, keys in self._sort_keys.items():
+            keys.append(self._sort_key(column, i))
+        return i
+
+    def update(self, i):
+        """records[i]被修改（如重命名）后同步各列"""
+        file_info = self.records[i]
+        self.ids[i] = int(file_info.get('fileId', 0))
+        self.sizes[i] = int(file_info.get('size') or 0)
+        self.types[i] = 1 if file_info.get('type') == 1 else 0
+        self.statuses[i] = int(file_info.get('status') or 0)
+        self.names[i] = file_info.get('filename', '')
+        self.create_ats[i] = file_info.get('createAt', '') or ''
+        for column, keys in self._sort_keys.items():
+            keys[i] = self._sort_key(column, i)
+
+    def position(self, file_id):
+        """文件ID在存储中的下标，不存在返回None"""
+        return self.positions.get(int(file_id))
+
+    def sort_keys(self, column):
+        """
+        某一列的排序键，按存储下标访问
+        数值列直接使用列数组；文件名、扩展名、创建时间的键第一次使用时计算并缓存
+        """
+        if column == 0:
+            return self.ids
+        elif column == 3:
+            return self.types
+        elif column == 4:
+            return self.sizes
+        elif column == 5:
+            return self.statuses
+        keys = self._sort_keys.get(column)
+        if keys is None:
+            keys = self._sort_keys[column] = [self._sort_key(column, i) for i in range(len(self.records))]
+        return keys
+
+    def _sort_key(self, column, i):
+        if column == 2:  # 扩展名
+            return self.extension(i).casefold()
+        elif column == 6:  # 创建时间
+            return parse_time(self.create_ats[i])
+        return natural_key(self.names[i])  # 文件名
+
+    def extension(self, i):
+        """扩展名列的显示文本"""
+        if self.types[i] == 1:
+            return "文件夹"
+        _, ext = os.path.splitext(self.names[i])
+        return ext[1:].upper() if ext else "无扩展名"
@@ -0,0 +1,58 @@
+"""
+folder_crawler.py - 并发递归遍历网盘文件夹
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import FOLDER_CRAWL_CONCURRENCY, FOLDER_CRAWL_PAGE_SIZE
+
+class FolderCrawler:
+    """
+    用固定数量的线程并发遍历文件夹树：每个文件夹通过iter_directory翻页取全，
+    子文件夹作为新任务提交，发现的文件立即通过回调交给调用方
+    """
+
+    def __init__(self, api, token, max_workers=FOLDER_CRAWL_CONCURRENCY, page_size=FOLDER_CRAWL_PAGE_SIZE):
+        self.api = api
+        self.token = token
+        self.max_workers = max_workers
+        self.page_size = page_size
+
+    def crawl(self, folder_id, on_file, should_stop=None, on_error=None):
+        """
+        遍历folder_id下的全部文件，on_file(file_info)在工作线程中调用，需自行保证线程安全；
+        单个文件夹获取失败时调用on_error(folder_id, e)并跳过该文件夹。返回发现的文件数
+        """
+        lock = threading.Lock()
+        done = threading.Event()
+        state = {"pending": 0, "files": 0}
+
+        def submit(fid):
+            with lock:
+                state["pending"] += 1
+            executor.submit(visit, fid)
+
+        def visit(fid):
+            try:
+                for file_info in self.api.iter_directory(self.token, fid, self.page_size):
+                    if should_stop and should_stop():
+                        return
+                    if file_info.get('type') == 1:  # 文件夹
+                        submit(file_info['fileId'])
+                    elif file_info.get('type') == 0:  # 文件
+                        with lock:
+                            state["files"] += 1
+                        on_file(file_info)
+            except Exception as e:
+                if on_error:
+                    on_error(fid, e)
+            finally:
+                with lock:
+                    state["pending"] -= 1
+                    if state["pending"] == 0:
+                        done.set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            submit(folder_id)
+            done.wait()
+        return state["files"]
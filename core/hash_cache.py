@@ -0,0 +1,88 @@
+"""
+hash_cache.py - 本地文件哈希缓存
+"""
+
+import os
+import json
+import time
+import threading
+from .utils import get_user_data_dir, sqlite_connect
+from config.settings import HASH_CACHE_MAX_ENTRIES
+
+class HashCache:
+    """
+    持久化的文件MD5缓存，以(路径, 大小, 修改时间, inode)判断文件是否变化，
+    记录整个文件的MD5和分片MD5，按最近使用时间淘汰
+    """
+
+    def __init__(self, db_file=None, max_entries=HASH_CACHE_MAX_ENTRIES):
+        self.db_file = db_file or os.path.join(get_user_data_dir(), "hash_cache.db")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        with sqlite_connect(self.db_file) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hash_cache ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+                "file_md5 TEXT, slice_size INTEGER, slice_md5s TEXT, last_used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_hash_cache_last_used ON hash_cache(last_used)")
+
+    @staticmethod
+    def _stat_key(file_path):
+        st = os.stat(file_path)
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def get(self, file_path):
+        """
+        查询缓存，文件大小、修改时间或inode变化时视为未命中
+        :param file_path: 文件路径
+        :return: (文件MD5, 分片大小, [分片MD5...])，未命中返回None
+        """
+        path = os.path.abspath(file_path)
+        try:
+            size, mtime_ns, inode = self._stat_key(path)
+        except OSError:
+            return None
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            row = conn.execute(
+                "SELECT size, mtime_ns, inode, file_md5, slice_size, slice_md5s FROM hash_cache WHERE path=?",
+                (path,)
+            ).fetchone()
+            if not row:
+                return None
+            if (row[0], row[1], row[2]) != (size, mtime_ns, inode):
+                conn.execute("DELETE FROM hash_cache WHERE path=?", (path,))
+                return None
+            conn.execute("UPDATE hash_cache SET last_used=? WHERE path=?", (time.time(), path))
+        return row[3], row[4], json.loads(row[5] or "[]")
+
+    def put(self, file_path, file_md5, slice_size, slice_md5s, stat_key=None):
+        """
+        写入缓存，超过容量时淘汰最久未使用的记录
+        :param stat_key: 计算哈希前取得的(大小, 修改时间, inode)，默认现取
+        """
+        path = os.path.abspath(file_path)
+        try:
+            size, mtime_ns, inode = stat_key or self._stat_key(path)
+        except OSError:
+            return
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO hash_cache "
+                "(path, size, mtime_ns, inode, file_md5, slice_size, slice_md5s, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, inode, file_md5, slice_size, json.dumps(slice_md5s), time.time())
+            )
+            count = conn.execute("SELECT COUNT(*) FROM hash_cache").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM hash_cache WHERE path IN "
+                    "(SELECT path FROM hash_cache ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def remove(self, file_path):
+        """删除某个文件的缓存"""
+        path = os.path.abspath(file_path)
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            conn.execute("DELETE FROM hash_cache WHERE path=?", (path,))
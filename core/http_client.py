@@ -0,0 +1,121 @@
+"""
+http_client.py - 共享HTTP连接池
+"""
+
+import time
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from .rate_limiter import get_api_rate_limiter, is_throttle_message, backoff_delay
+from config.settings import HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_TIMEOUT, API_MAX_RETRY
+
+class HttpClient:
+    """
+    按host复用keep-alive连接的HTTP客户端，所有API类共用；
+    请求按接口族限速，遇到限流时按抖动的指数退避自动重试
+    """
+
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, timeout=HTTP_TIMEOUT,
+                 rate_limiter=None, max_retry=API_MAX_RETRY):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or get_api_rate_limiter()
+        self.max_retry = max_retry
+        self._sessions = {}  # "scheme://host" -> requests.Session
+        self._lock = threading.Lock()
+
+    def get_session(self, url):
+        """
+        获取url所属host的会话，不存在则创建
+        :param url: 请求地址
+        :return: requests.Session
+        """
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                session.mount(key, adapter)
+                self._sessions[key] = session
+            return session
+
+    def request(self, method, url, **kwargs):
+        """
+        发送请求，未指定timeout时使用默认超时。
+        非流式请求遇到HTTP 429、频繁提示或GET请求5xx时退避后重试，重试用尽后返回最后一次响应
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        session = self.get_session(url)
+        path = urlsplit(url).path
+        for attempt in range(self.max_retry + 1):
+            self.rate_limiter.acquire(path)
+            resp = session.request(method, url, **kwargs)
+            if kwargs.get("stream") or attempt >= self.max_retry or not self._should_retry(method, resp):
+                return resp
+            resp.close()
+            self._rewind_files(kwargs.get("files"))
+            time.sleep(backoff_delay(attempt))
+        return resp
+
+    @staticmethod
+    def _should_retry(method, resp):
+        """是否为可重试的限流或服务端临时错误"""
+        if resp.status_code == 429:
+            return True
+        if resp.status_code >= 500:
+            # 非幂等请求可能已在服务端生效，不重试
+            return method == "GET"
+        if "json" not in resp.headers.get("Content-Type", ""):
+            return False
+        try:
+            data = resp.json()
+        except ValueError:
+            return False
+        if not isinstance(data, dict):
+            return False
+        return data.get("code") == 429 or is_throttle_message(str(data.get("message", "")))
+
+    @staticmethod
+    def _rewind_files(files):
+        """重试前把以文件对象上传的内容指针移回开头"""
+        if not files:
+            return
+        values = files.values() if isinstance(files, dict) else [item[1] for item in files]
+        for value in values:
+            fileobj = value[1] if isinstance(value, tuple) else value
+            if hasattr(fileobj, "seek"):
+                fileobj.seek(0)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def close(self):
+        """关闭所有会话"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_http_client():
+    """获取全局共享的HttpClient实例"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
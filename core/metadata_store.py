@@ -0,0 +1,138 @@
+"""
+metadata_store.py - 网盘目录元数据的本地镜像
+"""
+
+import os
+import json
+import time
+import threading
+from .utils import get_user_data_dir, sqlite_connect
+from config.settings import METADATA_REVALIDATE_AFTER
+
+class MetadataStore:
+    """
+    按用户持久化的目录树镜像（SQLite）：记录每个条目的fileId、parentFileId、文件名、大小、etag、类型、
+    是否在回收站和创建时间，以及每个文件夹最近一次完整列举的时间。
+    本地的增删改直接写入镜像，文件夹超过METADATA_REVALIDATE_AFTER秒未列举时才需要重新获取
+    """
+
+    def __init__(self, username=None, db_file=None, revalidate_after=METADATA_REVALIDATE_AFTER):
+        if db_file is None:
+            safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in (username or 'default'))
+            db_file = os.path.join(get_user_data_dir(), f"metadata_{safe_name}.db")
+        self.db_file = db_file
+        self.revalidate_after = revalidate_after
+        self._lock = threading.Lock()
+        with sqlite_connect(self.db_file) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "file_id INTEGER PRIMARY KEY, parent_id INTEGER, filename TEXT, size INTEGER, etag TEXT, "
+                "type INTEGER, trashed INTEGER, create_at TEXT, data TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_parent ON files(parent_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS folders (folder_id INTEGER PRIMARY KEY, synced_at REAL)")
+
+    @staticmethod
+    def _row(file_info, parent_id=None):
+        if parent_id is None:
+            parent_id = file_info.get('parentFileId', 0)
+        return (
+            int(file_info['fileId']), int(parent_id), file_info.get('filename', ''), file_info.get('size', 0),
+            file_info.get('etag', ''), file_info.get('type', 0), file_info.get('trashed', 0),
+            file_info.get('createAt', ''), json.dumps(file_info, ensure_ascii=False)
+        )
+
+    def get_folder(self, parent_id):
+        """
+        读取文件夹的镜像
+        :return: (条目列表, 最近完整列举的时间戳)，从未完整列举过返回None
+        """
+        parent_id = int(parent_id)
+        with sqlite_connect(self.db_file) as conn:
+            synced = conn.execute("SELECT synced_at FROM folders WHERE folder_id=?", (parent_id,)).fetchone()
+            if not synced:
+                return None
+            rows = conn.execute(
+                "SELECT data FROM files WHERE parent_id=? AND trashed=0 ORDER BY file_id", (parent_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows], synced[0]
+
+    def synced_at(self, parent_id):
+        """文件夹最近一次完整列举的时间戳，从未列举或已被作废返回None"""
+        with sqlite_connect(self.db_file) as conn:
+            row = conn.execute("SELECT synced_at FROM folders WHERE folder_id=?", (int(parent_id),)).fetchone()
+        return row[0] if row else None
+
+    def is_stale(self, synced_at):
+        """距最近一次完整列举超过revalidate_after秒，需要后台重新列举"""
+        return time.time() - synced_at > self.revalidate_after
+
+    def replace_folder(self, parent_id, files):
+        """用一次完整列举的结果替换文件夹镜像"""
+        parent_id = int(parent_id)
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            conn.execute("DELETE FROM files WHERE parent_id=?", (parent_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._row(f, parent_id) for f in files]
+            )
+            conn.execute("INSERT OR REPLACE INTO folders VALUES (?, ?)", (parent_id, time.time()))
+
+    def invalidate(self, parent_id):
+        """丢弃文件夹镜像，下次打开时重新列举"""
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            conn.execute("DELETE FROM folders WHERE folder_id=?", (int(parent_id),))
+
+    def upsert(self, files, parent_id=None):
+        """新增或更新条目（如新建文件夹、上传完成）"""
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._row(f, parent_id) for f in files]
+            )
+
+    def remove(self, file_ids):
+        """删除条目（移入回收站或彻底删除），文件夹的子树一并删除"""
+        ids = [int(i) for i in file_ids]
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            while ids:
+                # sqlite单条语句的参数个数有限，分块处理
+                chunk, ids = ids[:500], ids[500:]
+                marks = ",".join("?" * len(chunk))
+                ids.extend(row[0] for row in conn.execute(
+                    f"SELECT file_id FROM files WHERE parent_id IN ({marks})", chunk))
+                conn.execute(f"DELETE FROM files WHERE file_id IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM folders WHERE folder_id IN ({marks})", chunk)
+
+    def move(self, file_ids, to_parent_id):
+        """把条目移动到新的父目录"""
+        to_parent_id = int(to_parent_id)
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            for file_id in file_ids:
+                row = conn.execute("SELECT data FROM files WHERE file_id=?", (int(file_id),)).fetchone()
+                if not row:
+                    continue
+                file_info = json.loads(row[0])
+                file_info['parentFileId'] = to_parent_id
+                conn.execute(
+                    "UPDATE files SET parent_id=?, data=? WHERE file_id=?",
+                    (to_parent_id, json.dumps(file_info, ensure_ascii=False), int(file_id))
+                )
+
+    def rename(self, file_id, filename):
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            row = conn.execute("SELECT data FROM files WHERE file_id=?", (int(file_id),)).fetchone()
+            if not row:
+                return
+            file_info = json.loads(row[0])
+            file_info['filename'] = filename
+            conn.execute(
+                "UPDATE files SET filename=?, data=? WHERE file_id=?",
+                (filename, json.dumps(file_info, ensure_ascii=False), int(file_id))
+            )
+
+    def clear(self):
+        with self._lock, sqlite_connect(self.db_file) as conn:
+            conn.execute("DELETE FROM files")
+            conn.execute("DELETE FROM folders")
@@ -0,0 +1,125 @@
+"""
+progress_poller.py - 离线任务进度轮询调度
+"""
+
+import time
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import (
+    OFFLINE_POLL_CONCURRENCY, OFFLINE_POLL_MIN_INTERVAL,
+    OFFLINE_POLL_MAX_INTERVAL, OFFLINE_POLL_STEP
+)
+
+TERMINAL_STATUSES = ("成功", "失败")
+STATUS_NAMES = {0: "进行中", 1: "失败", 2: "成功", 3: "重试中"}
+
+class ProgressPoller:
+    """
+    按任务各自的下次查询时间调度进度查询：进度推进快的任务查得勤，
+    长时间没有变化的任务按指数退避拉长间隔，成功/失败的任务不再查询。
+    查询在线程池中并发执行，总请求速率由接口层的限速器控制
+    """
+
+    def __init__(self, api, max_workers=OFFLINE_POLL_CONCURRENCY,
+                 min_interval=OFFLINE_POLL_MIN_INTERVAL, max_interval=OFFLINE_POLL_MAX_INTERVAL):
+        self.api = api
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._tasks = {}  # task_id -> 任务对象
+        self._state = {}  # task_id -> [间隔, 上次进度, 上次查询时间, 下次查询时间]
+        self._heap = []  # (下次查询时间, task_id)，与_state中下次查询时间不一致的条目已过期
+
+    def set_tasks(self, tasks):
+        """同步要轮询的任务：新任务立即查询，已移除或已结束的任务不再查询"""
+        now = time.monotonic()
+        with self._lock:
+            wanted = {t.task_id: t for t in tasks if t.task_id and t.status not in TERMINAL_STATUSES}
+            for task_id in list(self._tasks):
+                if task_id not in wanted:
+                    del self._tasks[task_id]
+                    self._state.pop(task_id, None)
+            for task_id, task in wanted.items():
+                self._tasks[task_id] = task
+                if task_id not in self._state:
+                    self._state[task_id] = [self.min_interval, task.progress, None, now]
+                    heapq.heappush(self._heap, (now, task_id))
+
+    def _is_current(self, entry):
+        """堆条目是否仍有效：任务被移除或重新加入、已重新排期后，旧条目直接丢弃"""
+        due, task_id = entry
+        state = self._state.get(task_id)
+        return state is not None and state[3] == due
+
+    def has_tasks(self):
+        with self._lock:
+            return bool(self._tasks)
+
+    def seconds_until_due(self):
+        """距离最近一个任务到期的秒数，没有任务时返回None"""
+        with self._lock:
+            while self._heap and not self._is_current(self._heap[0]):
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(0, self._heap[0][0] - time.monotonic())
+
+    def poll_due(self, token, limit=None):
+        """并发查询已到期的任务（最多limit个），返回状态或进度有变化的任务"""
+        now = time.monotonic()
+        limit = limit or self.max_workers * 2
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < limit:
+                entry = heapq.heappop(self._heap)
+                if self._is_current(entry):
+                    due.append(self._tasks[entry[1]])
+        if not due:
+            return []
+        results = list(self._executor.map(lambda t: self._query(token, t), due))
+        return [task for task, changed in zip(due, results) if changed]
+
+    def _query(self, token, task):
+        try:
+            resp = self.api.check_download_progress(token, task.task_id)
+            if resp.get('code') == 0 and 'data' in resp:
+                progress = int(resp['data'].get('process', 0))
+                st = resp['data'].get('status', 0)
+                status = STATUS_NAMES.get(st, str(st))
+            else:
+                progress, status = task.progress, "查询失败"
+        except Exception:
+            progress, status = task.progress, "查询失败"
+        changed = progress != task.progress or status != task.status
+        task.progress = progress
+        task.status = status
+        self._reschedule(task, progress, status)
+        return changed
+
+    def _reschedule(self, task, progress, status):
+        """根据观察到的进度速率计算下次查询时间"""
+        now = time.monotonic()
+        with self._lock:
+            if task.task_id not in self._tasks:
+                return
+            if status in TERMINAL_STATUSES:
+                del self._tasks[task.task_id]
+                self._state.pop(task.task_id, None)
+                return
+            state = self._state[task.task_id]
+            interval, last_progress, last_time, _ = state
+            if last_time is not None and progress > last_progress:
+                # 预计再推进OFFLINE_POLL_STEP个百分点所需的时间，且不晚于预计完成时间
+                speed = (progress - last_progress) / max(now - last_time, 1e-3)
+                interval = min(OFFLINE_POLL_STEP / speed, (100 - progress) / speed)
+            elif last_time is not None:
+                interval *= 2
+            interval = min(max(interval, self.min_interval), self.max_interval)
+            state[:] = [interval, progress, now, now + interval]
+            heapq.heappush(self._heap, (now + interval, task.task_id))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
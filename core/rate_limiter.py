@@ -0,0 +1,90 @@
+"""
+rate_limiter.py - 令牌桶限速与接口退避重试策略
+"""
+
+import time
+import random
+import threading
+from config.settings import API_RATE_LIMITS, API_RETRY_BACKOFF, API_RETRY_MAX_DELAY
+
+class TokenBucket:
+    """
+    令牌桶：按rate每秒补充令牌，最多积攒capacity个；
+    consume在令牌不足时阻塞到补足为止，rate<=0表示不限速
+    """
+
+    def __init__(self, rate, capacity=None):
+        self._lock = threading.Lock()
+        self.set_rate(rate, capacity)
+
+    def set_rate(self, rate, capacity=None):
+        """调整速率，可在运行中修改"""
+        with self._lock:
+            self.rate = rate
+            self.capacity = capacity or rate
+            self.tokens = self.capacity
+            self.updated = time.monotonic()
+
+    def consume(self, amount=1):
+        """
+        取走amount个令牌，不足时先记账再睡眠补足，保证长期平均速率不超过rate
+        """
+        with self._lock:
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+# 123云盘“请求过于频繁”类提示，出现时应退避后重试
+THROTTLE_MESSAGES = ("请间隔", "频繁", "too many", "Too Many")
+
+def is_throttle_message(message):
+    """判断接口返回的message是否为限流提示（校验中的提示由各接口自行轮询处理）"""
+    message = message or ""
+    return "校验中" not in message and any(k in message for k in THROTTLE_MESSAGES)
+
+def backoff_delay(attempt, base=API_RETRY_BACKOFF, cap=API_RETRY_MAX_DELAY):
+    """第attempt次（从0开始）重试前的等待秒数：指数增长、有上限，并加入随机抖动避免多线程同时重试"""
+    return min(cap, base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+class ApiRateLimiter:
+    """
+    按接口族限速：以接口路径前缀区分，每个前缀一个令牌桶，
+    路径匹配最长的前缀；未配置的路径（如下载CDN、分片上传）不限速
+    """
+
+    def __init__(self, limits=None):
+        limits = API_RATE_LIMITS if limits is None else limits
+        # 长前缀优先匹配
+        self._prefixes = sorted(limits, key=len, reverse=True)
+        self._buckets = {prefix: TokenBucket(rate) for prefix, rate in limits.items()}
+
+    def family_for(self, path):
+        """返回路径所属的接口族前缀，未配置时返回None"""
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return prefix
+        return None
+
+    def acquire(self, path):
+        """按接口族取一个令牌，必要时阻塞"""
+        family = self.family_for(path)
+        if family is not None:
+            self._buckets[family].consume()
+
+_api_limiter = None
+_api_limiter_lock = threading.Lock()
+
+def get_api_rate_limiter():
+    """获取全局共享的ApiRateLimiter实例"""
+    global _api_limiter
+    with _api_limiter_lock:
+        if _api_limiter is None:
+            _api_limiter = ApiRateLimiter()
+        return _api_limiter
@@ -1,9 +1,13 @@
-import requests
+import time
+from .http_client import get_http_client
+from .rate_limiter import backoff_delay
+from config.settings import UPLOAD_VERIFY_POLL_MAX_DELAY
 
 # 上传相关API接口
 class UploadApi:
-    def __init__(self, base_url="https://open-api.123pan.com"):
+    def __init__(self, base_url="https://open-api.123pan.com", http=None):
         self.base_url = base_url
+        self.http = http or get_http_client()
 
     def create_file(self, token, file_name, file_size, file_md5, parent_file_id=0, duplicate=None, contain_dir=False):
         """
@@ -44,7 +48,7 @@ class UploadApi:
             body["duplicate"] = duplicate
         if contain_dir:
             body["containDir"] = True
-        resp = requests.post(url, headers=headers, json=body, timeout=15)
+        resp = self.http.post(url, headers=headers, json=body, timeout=15)
         resp.raise_for_status()
         return resp.json()
 
@@ -54,7 +58,7 @@ class UploadApi:
         :param token: access_token
         :param preupload_id: 预上传ID
         :param slice_index: 分片序号（从1开始）
-        :param slice_data: 分片二进制内容
+        :param slice_data: 分片二进制内容，支持bytes/bytearray/memoryview（直接发送，不复制）
         :param slice_md5: 分片MD5
         :param server: 上传域名（如 http://openapi-upload.123242.com）
         :param max_retry: 最大重试次数
@@ -66,7 +70,7 @@ class UploadApi:
             raise ValueError("slice_index必须为正整数且从1开始")
         if not slice_md5 or len(slice_md5) != 32:
             raise ValueError("sliceMD5格式不正确")
-        if not slice_data or not isinstance(slice_data, (bytes, bytearray)):
+        if not isinstance(slice_data, (bytes, bytearray, memoryview)) or not len(slice_data):
             raise ValueError("slice_data必须为二进制内容")
         url = server.rstrip('/') + "/upload/v2/file/slice"
         headers = {
@@ -81,15 +85,14 @@ class UploadApi:
         files = {
             "slice": (f"part{slice_index}.bin", slice_data, "application/octet-stream")
         }
-        import time
         for retry in range(max_retry):
-            resp = requests.post(url, headers=headers, data=data, files=files, timeout=30)
+            resp = self.http.post(url, headers=headers, data=data, files=files, timeout=30)
             resp.raise_for_status()
             result = resp.json()
             if result.get("code") == 0:
                 return result
             if "校验中" in result.get("message", "") or "请间隔1秒后再试" in result.get("message", ""):
-                time.sleep(1)
+                time.sleep(backoff_delay(retry, cap=UPLOAD_VERIFY_POLL_MAX_DELAY))
                 continue
             return result
         return {"code": -1, "message": "分片上传校验超时", "data": {}}
@@ -116,10 +119,9 @@ class UploadApi:
         body = {
             "preuploadID": preupload_id
         }
-        import time
         last_file_id = None
         for retry in range(max_retry):
-            resp = requests.post(url, headers=headers, json=body, timeout=15)
+            resp = self.http.post(url, headers=headers, json=body, timeout=15)
             resp.raise_for_status()
             data = resp.json()
             # code==0 且 completed==True 时返回
@@ -132,7 +134,7 @@ class UploadApi:
                 if data.get("data", {}).get("completed") is False and (
                     "校验中" in data.get("message", "") or "请间隔1秒后再试" in data.get("message", "")
                 ):
-                    time.sleep(1)
+                    time.sleep(backoff_delay(retry, cap=UPLOAD_VERIFY_POLL_MAX_DELAY))
                     continue
             # 其他情况直接返回
             return data
@@ -154,7 +156,7 @@ class UploadApi:
             "Authorization": f"Bearer {token}",
             "Platform": "open_platform"
         }
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = self.http.get(url, headers=headers, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         if data.get("code") == 0 and isinstance(data.get("data"), list):
@@ -199,19 +201,18 @@ class UploadApi:
             data["duplicate"] = str(duplicate)
         if contain_dir:
             data["containDir"] = "true"
-        import time
         with open(file_path, "rb") as f:
             files = {
                 "file": (filename, f, "application/octet-stream")
             }
             for retry in range(max_retry):
-                resp = requests.post(url, headers=headers, data=data, files=files, timeout=60)
+                resp = self.http.post(url, headers=headers, data=data, files=files, timeout=60)
                 resp.raise_for_status()
                 result = resp.json()
                 if result.get("code") == 0:
                     return result
                 if "校验中" in result.get("message", "") or "请间隔1秒后再试" in result.get("message", ""):
-                    time.sleep(1)
+                    time.sleep(backoff_delay(retry, cap=UPLOAD_VERIFY_POLL_MAX_DELAY))
                     continue
                 return result
             return {"code": -1, "message": "单文件上传校验超时", "data": {}}
@@ -230,6 +231,6 @@ class UploadApi:
             "Content-Type": "application/json"
         }
         params = {"fileID": file_id}
-        resp = requests.get(url, headers=headers, params=params, timeout=10)
+        resp = self.http.get(url, headers=headers, params=params, timeout=10)
         resp.raise_for_status()
         return resp.json() 
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+upload_journal.py - 分片上传断点记录
+"""
+
+import os
+import json
+import time
+import threading
+from .utils import get_user_data_dir
+from config.settings import UPLOAD_JOURNAL_SAVE_INTERVAL
+
+class UploadJournal:
+    """
+    记录未完成的分片上传：预上传ID、上传域名、分片大小和已确认的分片序号，
+    程序重启后据此从缺失的分片继续上传。
+    预上传ID和目录ID属于具体账号，每个用户一个记录文件；
+    分片完成的记录按save_interval合并写盘，flush立即写盘
+    """
+
+    def __init__(self, username=None, journal_file=None, save_interval=UPLOAD_JOURNAL_SAVE_INTERVAL):
+        if journal_file is None:
+            safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in (username or 'default'))
+            journal_file = os.path.join(get_user_data_dir(), f"upload_journal_{safe_name}.json")
+        self.FILE = journal_file
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = 0
+        self._entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.FILE):
+            return {}
+        try:
+            with open(self.FILE, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except Exception:
+            return {}
+        for entry in entries.values():
+            entry["done_slices"] = set(entry["done_slices"])
+        return entries
+
+    def _save(self):
+        # 先写临时文件再替换，避免中途崩溃留下半个文件
+        data = {key: dict(entry, done_slices=sorted(entry["done_slices"])) for key, entry in self._entries.items()}
+        tmp_file = self.FILE + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.FILE)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self):
+        """把合并中的分片记录立即写盘"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    @staticmethod
+    def make_key(file_path, file_md5, parent_id):
+        return f"{os.path.abspath(file_path)}|{file_md5}|{parent_id}"
+
+    def get(self, key):
+        """获取上传记录，返回副本；不存在返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry, done_slices=sorted(entry["done_slices"])) if entry else None
+
+    def entries(self):
+        """返回所有未完成的上传记录"""
+        with self._lock:
+            return [dict(entry, key=key, done_slices=sorted(entry["done_slices"])) for key, entry in self._entries.items()]
+
+    def begin(self, key, file_path, file_size, file_md5, parent_id, preupload_id, servers, slice_size):
+        """create_file成功后登记一次新的分片上传"""
+        with self._lock:
+            self._entries[key] = {
+                "file_path": os.path.abspath(file_path),
+                "file_size": file_size,
+                "file_md5": file_md5,
+                "parent_id": parent_id,
+                "preupload_id": preupload_id,
+                "servers": servers,
+                "slice_size": slice_size,
+                "done_slices": set(),
+                "updated_at": time.time()
+            }
+            self._save()
+
+    def mark_slice_done(self, key, slice_index):
+        """记录服务端已确认的分片，距上次写盘不足save_interval时只标记待写"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or slice_index in entry["done_slices"]:
+                return
+            entry["done_slices"].add(slice_index)
+            entry["updated_at"] = time.time()
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self._save()
+
+    def remove(self, key):
+        """上传完成、取消或记录失效时删除"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
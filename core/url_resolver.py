@@ -0,0 +1,86 @@
+"""
+url_resolver.py - 并发获取并缓存文件下载地址
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from .file_api import FileApi
+from config.settings import (
+    DOWNLOAD_URL_RESOLVE_CONCURRENCY, DOWNLOAD_URL_CACHE_TTL, DOWNLOAD_URL_EXPIRY_MARGIN
+)
+
+class DownloadUrlResolver:
+    """
+    用固定数量的线程并发调用download_info接口，总请求速率由接口层的限速器控制；
+    拿到的签名地址按其过期时间缓存，过期前再次请求同一文件直接返回缓存
+    """
+
+    def __init__(self, api=None, max_workers=DOWNLOAD_URL_RESOLVE_CONCURRENCY):
+        self.api = api or FileApi()
+        self.max_workers = max_workers
+        self._cache = {}  # file_id -> (url, 过期时间戳)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @staticmethod
+    def parse_expiry(url):
+        """
+        从签名地址中解析过期时间戳，支持auth_key=<过期时间>-...和expires/t参数；
+        解析不到时返回None
+        """
+        query = parse_qs(urlsplit(url).query)
+        candidates = []
+        if "auth_key" in query:
+            candidates.append(query["auth_key"][0].split("-", 1)[0])
+        for name in ("expires", "Expires", "t"):
+            if name in query:
+                candidates.append(query[name][0])
+        for value in candidates:
+            if value.isdigit() and 1e9 < int(value) < 1e11:
+                return int(value)
+        return None
+
+    def get_cached(self, file_id):
+        """返回仍在有效期内的缓存地址，没有则返回None"""
+        with self._lock:
+            entry = self._cache.get(file_id)
+            if entry and entry[1] - DOWNLOAD_URL_EXPIRY_MARGIN > time.time():
+                return entry[0]
+            self._cache.pop(file_id, None)
+        return None
+
+    def invalidate(self, file_id):
+        with self._lock:
+            self._cache.pop(file_id, None)
+
+    def resolve(self, token, file_id, refresh=False):
+        """获取文件下载地址，refresh为True时忽略缓存重新请求"""
+        if not refresh:
+            url = self.get_cached(file_id)
+            if url:
+                return url
+        url = self.api.get_download_url(token, file_id)
+        expires_at = self.parse_expiry(url) or time.time() + DOWNLOAD_URL_CACHE_TTL
+        with self._lock:
+            self._cache[file_id] = (url, expires_at)
+        return url
+
+    def submit(self, token, file_id):
+        """在后台线程中获取下载地址，返回Future"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor.submit(self.resolve, token, file_id)
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_url_resolver():
+    """获取全局共享的DownloadUrlResolver实例"""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = DownloadUrlResolver()
+        return _resolver
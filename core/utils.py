@@ -5,6 +5,8 @@ utils.py - 通用工具函数
 import os
 import sys
 import hashlib
+import sqlite3
+from contextlib import contextmanager
 
 def get_user_data_dir():
     """
@@ -26,6 +28,19 @@ def get_user_data_dir():
     
     return app_data
 
+@contextmanager
+def sqlite_connect(db_file):
+    """
+    打开sqlite数据库并在一个事务中执行，正常结束时提交、出错时回滚，最后关闭连接。
+    每次操作使用独立连接，多线程/多进程写入由sqlite的文件锁串行化
+    """
+    conn = sqlite3.connect(db_file, timeout=30)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
 def get_base_path():
     """
     获取应用程序的基础路径
@@ -42,23 +57,33 @@ def get_base_path():
         base_path = os.path.dirname(os.path.abspath(__file__))
     return base_path
 
-def split_file(file_path, slice_size):
+def iter_file_slices(file_path, slice_size, start_index=1, skip=None):
     """
-    按分片大小切割文件，返回每个分片的二进制内容
+    按分片大小惰性读取文件，每次只读出一个分片，不会把整个文件读入内存
     :param file_path: 文件路径
     :param slice_size: 分片大小（字节）
-    :return: [(index, data), ...]
+    :param start_index: 起始分片序号（从1开始）
+    :param skip: 可选，需要跳过的分片序号集合（如断点续传时已上传的分片）
+    :return: 生成器，依次产出(index, memoryview)
     """
-    slices = []
     with open(file_path, "rb") as f:
-        index = 1
-        while True:
-            chunk = f.read(slice_size)
-            if not chunk:
+        total = count_slices(os.fstat(f.fileno()).st_size, slice_size)
+        for index in range(start_index, total + 1):
+            if skip and index in skip:
+                continue
+            f.seek((index - 1) * slice_size)
+            # 每个分片独立分配缓冲区，上传线程持有的视图不会被后续读取覆盖
+            buf = bytearray(slice_size)
+            n = f.readinto(buf)
+            if not n:
                 break
-            slices.append((index, chunk))
-            index += 1
-    return slices
+            yield index, memoryview(buf)[:n]
+
+def count_slices(file_size, slice_size):
+    """
+    计算文件的分片数量
+    """
+    return (file_size + slice_size - 1) // slice_size
 
 def calc_file_md5(file_path):
     """
@@ -73,6 +98,27 @@ def calc_file_md5(file_path):
             md5.update(chunk)
     return md5.hexdigest()
 
+def calc_file_and_slice_md5(file_path, slice_size):
+    """
+    只读一遍文件，同时计算整个文件的MD5和每个分片的MD5
+    :param file_path: 文件路径
+    :param slice_size: 分片大小（字节）
+    :return: (文件MD5, [分片1的MD5, 分片2的MD5, ...])
+    """
+    file_md5 = hashlib.md5()
+    slice_md5s = []
+    buf = bytearray(slice_size)
+    view = memoryview(buf)
+    with open(file_path, "rb") as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            chunk = view[:n]
+            file_md5.update(chunk)
+            slice_md5s.append(hashlib.md5(chunk).hexdigest())
+    return file_md5.hexdigest(), slice_md5s
+
 def calc_bytes_md5(data):
     """
     计算二进制数据的MD5
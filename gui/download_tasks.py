@@ -1,7 +1,11 @@
 import os
 import json
+import tempfile
 import threading
-import requests
+import uuid
+import heapq
+from core.downloader import SegmentedDownloader
+from config.settings import DOWNLOAD_MAX_ACTIVE_TASKS, TASKS_SAVE_INTERVAL
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget, QTableWidgetItem, QFileDialog, QProgressBar, QMessageBox
 from PyQt5.QtWidgets import QHeaderView
 from PyQt5.QtCore import Qt, QTimer
@@ -23,8 +27,21 @@ def get_download_path_file(username):
 
 PATH_FILE = os.path.join(os.path.expanduser('~'), '.oprnapidown_path.txt')
 
+def write_json_atomic(path, data):
+    """先写同目录下的唯一临时文件再替换，避免写到一半崩溃导致任务文件损坏"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 class DownloadTask:
-    def __init__(self, file_id, file_name, url, save_path, status='等待中', progress=0):
+    def __init__(self, file_id, file_name, url, save_path, status='等待中', progress=0, task_id=None):
+        self.task_id = task_id or uuid.uuid4().hex  # 任务唯一标识，同一文件可以有多个下载任务
         self.file_id = file_id
         self.file_name = file_name
         self.url = url
@@ -32,13 +49,23 @@ class DownloadTask:
         self.status = status
         self.progress = progress
         self.thread = None
+        self.running = False  # 是否正在某个下载工作线程中执行
+        self._queue_seq = 0  # 最近一次入队的序号，用于识别调度队列中的过期条目
         self._stop_flag = False  # 新增中断标志
+        self._keep_partial = False  # 中断时是否保留已下载部分（暂停）
+        self.lock = threading.Lock()  # 保护单个任务的状态修改
 
     def stop(self):
         self._stop_flag = True
 
+    def pause(self):
+        """暂停：中断下载但保留.part文件，之后可断点续传"""
+        self._keep_partial = True
+        self._stop_flag = True
+
     def to_dict(self):
         return {
+            'task_id': self.task_id,
             'file_id': self.file_id,
             'file_name': self.file_name,
             'url': self.url,
@@ -48,31 +75,76 @@ class DownloadTask:
         }
     @staticmethod
     def from_dict(d):
-        return DownloadTask(d['file_id'], d['file_name'], d['url'], d['save_path'], d.get('status', '等待中'), d.get('progress', 0))
+        status = d.get('status', '等待中')
+        # 上次退出时仍在下载或排队的任务不在本次的调度队列中，重启后标为已暂停，可从.part文件续传
+        if status in ('下载中', '排队中'):
+            status = '已暂停'
+        return DownloadTask(d['file_id'], d['file_name'], d['url'], d['save_path'], status, d.get('progress', 0), d.get('task_id'))
 
 class DownloadTaskManager:
     def __init__(self, username=None):
         self.username = username or 'default'
+        self.lock = threading.RLock()  # 只保护任务列表、索引和写盘，save_tasks内部也会获取
+        self._timer_lock = threading.Lock()
+        self._dirty = False  # 内存中的任务状态是否有未写盘的修改
+        self._flush_timer = None
         self.tasks = self.load_tasks()
         self.download_path = self.load_path()
-        self.lock = threading.Lock()
+        self.downloader = SegmentedDownloader()
+        self.url_resolver = None  # 可选，url_resolver(file_id) -> 新的下载地址，用于签名地址过期时重新获取
+        # 全局下载调度：优先级队列 + 固定数量的工作线程
+        self._queue = []  # 堆，元素为 (priority, seq, task, callback)
+        self._queue_seq = 0
+        self._cond = threading.Condition()
+        self._workers = []
+        self.queue_paused = False
+        self._paused_by_queue = []  # 整体暂停时被中断的任务，整体继续时重新入队
 
     def set_user(self, username):
+        self.flush()
         self.username = username
         self.tasks = self.load_tasks()
         self.download_path = self.load_path()
+
+    def _rebuild_index(self):
+        """按任务ID和文件ID建立索引（调用方持有lock或处于初始化阶段）"""
+        self._by_id = {t.task_id: t for t in self.tasks}
+        self._by_file_id = {}
+        for t in self.tasks:
+            self._by_file_id.setdefault(t.file_id, []).append(t)
         # 路径可选是否也按用户分，暂保留原逻辑
 
     def load_tasks(self):
         tasks_file = get_download_tasks_file(self.username)
         if os.path.exists(tasks_file):
             with open(tasks_file, 'r', encoding='utf-8') as f:
-                return [DownloadTask.from_dict(t) for t in json.load(f)]
-        return []
+                tasks = [DownloadTask.from_dict(t) for t in json.load(f)]
+        else:
+            tasks = []
+        self.tasks = tasks
+        self._rebuild_index()
+        return tasks
     def save_tasks(self):
-        tasks_file = get_download_tasks_file(self.username)
-        with open(tasks_file, 'w', encoding='utf-8') as f:
-            json.dump([t.to_dict() for t in self.tasks], f, ensure_ascii=False, indent=2)
+        with self.lock:
+            tasks_file = get_download_tasks_file(self.username)
+            write_json_atomic(tasks_file, [t.to_dict() for t in self.tasks])
+            self._dirty = False
+
+    def flush(self):
+        """把尚未写盘的进度立即保存"""
+        with self.lock:
+            if self._dirty:
+                self.save_tasks()
+
+    def _schedule_flush(self):
+        """进度变化只标记为脏，由定时器合并写盘"""
+        with self.lock:
+            self._dirty = True
+        with self._timer_lock:
+            if self._flush_timer is None or not self._flush_timer.is_alive():
+                self._flush_timer = threading.Timer(TASKS_SAVE_INTERVAL, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
     def load_path(self):
         path_file = get_download_path_file(self.username)
         if os.path.exists(path_file):
@@ -115,58 +187,161 @@ class DownloadTaskManager:
         task = DownloadTask(file_id, file_name, url, valid_path)
         with self.lock:
             self.tasks.append(task)
+            self._by_id[task.task_id] = task
+            self._by_file_id.setdefault(file_id, []).append(task)
             self.save_tasks()
         return task
     def get_tasks(self):
         return self.tasks
-    def update_task_status(self, file_id, status, progress=None):
+    def get_task(self, task_id):
+        return self._by_id.get(task_id)
+    def get_tasks_by_file_id(self, file_id):
+        return list(self._by_file_id.get(file_id, []))
+    def remove_tasks(self, tasks):
+        """从列表和索引中移除任务并保存"""
+        remove_ids = {t.task_id for t in tasks}
+        with self.lock:
+            self.tasks[:] = [t for t in self.tasks if t.task_id not in remove_ids]
+            self._rebuild_index()
+            self.save_tasks()
+    def update_task_status(self, task_id, status, progress=None):
+        """按任务ID在内存中更新任务；状态切换立即写盘，单纯的进度变化合并后定时写盘"""
+        task = self._by_id.get(task_id)
+        if task is None:
+            return
+        # 进度更新只锁单个任务，多个下载之间互不阻塞
+        with task.lock:
+            status_changed = task.status != status
+            progress_changed = progress is not None and task.progress != progress
+            task.status = status
+            if progress is not None:
+                task.progress = progress
+        if status_changed:
+            with self.lock:
+                self.save_tasks()
+        elif progress_changed:
+            self._schedule_flush()
+    def start_download(self, task, callback=None, priority=0):
+        """
+        把下载任务放入全局调度队列，由固定数量的工作线程执行。
+        priority越小越先下载，相同优先级按入队顺序
+        """
+        with self._cond:
+            task._stop_flag = False
+            task._keep_partial = False
+            # 状态须在入队前设置，否则工作线程可能把新条目当作过期条目丢弃
+            with task.lock:
+                task.status = '排队中'
+            self._queue_seq += 1
+            task._queue_seq = self._queue_seq
+            heapq.heappush(self._queue, (priority, self._queue_seq, task, callback))
+            self._ensure_workers()
+            self._cond.notify()
         with self.lock:
-            for t in self.tasks:
-                if t.file_id == file_id:
-                    t.status = status
-                    if progress is not None:
-                        t.progress = progress
             self.save_tasks()
-    def start_download(self, task, callback=None):
-        def run():
+
+    def _ensure_workers(self):
+        """按需启动下载工作线程，线程数固定为DOWNLOAD_MAX_ACTIVE_TASKS"""
+        while len(self._workers) < DOWNLOAD_MAX_ACTIVE_TASKS:
+            worker = threading.Thread(target=self._worker_loop, daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue or self.queue_paused:
+                    self._cond.wait()
+                _, seq, task, callback = heapq.heappop(self._queue)
+                # 排队期间被暂停、删除或重新入队的旧条目直接丢弃
+                if seq != task._queue_seq or task._stop_flag or task.status != '排队中':
+                    continue
+                task.running = True
+                task.thread = threading.current_thread()
             try:
-                local_path = os.path.join(task.save_path, task.file_name)
-                with requests.get(task.url, stream=True) as r:
-                    r.raise_for_status()
-                    total = int(r.headers.get('content-length', 0))
-                    with open(local_path, 'wb') as f:
-                        downloaded = 0
-                        for chunk in r.iter_content(chunk_size=8192):
-                            if task._stop_flag:
-                                break
-                            if chunk:
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                percent = int(downloaded * 100 / total) if total else 0
-                                self.update_task_status(task.file_id, '下载中', percent)
-                                if callback:
-                                    callback()
-                    if task._stop_flag:
-                        # 被中断，删除未完成文件
-                        if os.path.exists(local_path):
-                            try:
-                                os.remove(local_path)
-                            except Exception:
-                                pass
-                        self.update_task_status(task.file_id, '已取消', 0)
-                    else:
-                        self.update_task_status(task.file_id, '已完成', 100)
-            except Exception as e:
-                self.update_task_status(task.file_id, f'失败: {e}')
+                self.run_task(task, callback)
+            finally:
+                with self._cond:
+                    task.running = False
+                    task.thread = None
+                    self._cond.notify_all()
+
+    def run_task(self, task, callback=None):
+        """在工作线程中执行单个下载任务"""
+        try:
+            local_path = os.path.join(task.save_path, task.file_name)
+
+            def on_progress(downloaded, total):
+                percent = int(downloaded * 100 / total) if total else 0
+                self.update_task_status(task.task_id, '下载中', percent)
                 if callback:
                     callback()
-        t = threading.Thread(target=run, daemon=True)
-        task.thread = t
-        t.start()
+
+            # 支持Range时分段并发下载，否则单连接下载；有.part文件时断点续传
+            try:
+                completed = self.downloader.download(task.url, local_path, on_progress, lambda: task._stop_flag)
+            except Exception as e:
+                status_code = getattr(getattr(e, 'response', None), 'status_code', None)
+                if status_code not in (401, 403, 404, 410) or not self.url_resolver:
+                    raise
+                # 签名下载地址已过期，重新获取后继续
+                task.url = self.url_resolver(task.file_id)
+                completed = self.downloader.download(task.url, local_path, on_progress, lambda: task._stop_flag)
+            if not completed and task._keep_partial:
+                self.update_task_status(task.task_id, '已暂停')
+            elif not completed:
+                # 被中断，删除未完成文件
+                self.downloader.discard_partial(local_path)
+                self.update_task_status(task.task_id, '已取消', 0)
+            else:
+                self.update_task_status(task.task_id, '已完成', 100)
+        except Exception as e:
+            self.update_task_status(task.task_id, f'失败: {e}')
+            if callback:
+                callback()
+
+    def pause_task(self, task):
+        """暂停单个任务：下载中的保留.part文件后停止，排队中的直接出队"""
+        with self._cond:
+            running = task.running
+            if running:
+                task.pause()
+        if not running and task.status in ('排队中', '等待中'):
+            self.update_task_status(task.task_id, '已暂停')
+
+    def wait_stopped(self, task, timeout=2):
+        """等待任务所在的工作线程结束该任务"""
+        with self._cond:
+            self._cond.wait_for(lambda: not task.running, timeout)
+
+    def pause_queue(self):
+        """整体暂停：停止派发新任务，并暂停正在下载的任务"""
+        with self._cond:
+            self.queue_paused = True
+            for task in self.tasks:
+                if task.running:
+                    task.pause()
+                    self._paused_by_queue.append(task)
+
+    def resume_queue(self):
+        """整体继续：被整体暂停打断的任务按原顺序重新入队，恢复派发"""
+        with self._cond:
+            self.queue_paused = False
+            paused, self._paused_by_queue = self._paused_by_queue, []
+            self._cond.notify_all()
+        for task in paused:
+            if self._by_id.get(task.task_id) is task:
+                self.wait_stopped(task)
+                self.start_download(task, priority=-1)
+
+    def set_bandwidth_limit(self, bytes_per_second):
+        """设置所有下载共享的限速（字节/秒），0为不限速"""
+        self.downloader.set_bandwidth_limit(bytes_per_second)
 
     def clear_tasks(self):
         with self.lock:
             self.tasks = []
+            self._rebuild_index()
             self.save_tasks()
             # 如果文件为空则物理删除
             tasks_file = get_download_tasks_file(self.username)
@@ -206,6 +381,20 @@ class DownloadTaskWidget(QWidget):
         self.delete_btn.setStyleSheet('QPushButton{min-width:60px;max-width:90px;min-height:26px;max-height:32px;font-size:14px;background:#FF7875;color:#fff;border-radius:8px;} QPushButton:hover{background:#FF4D4F;}')
         self.delete_btn.clicked.connect(self.on_delete_task)
         path_layout.addWidget(self.delete_btn)
+        # 整体暂停/继续下载队列
+        self.queue_btn = QPushButton("全部暂停")
+        self.queue_btn.setStyleSheet('QPushButton{min-width:60px;max-width:90px;min-height:26px;max-height:32px;font-size:14px;background:#FAAD14;color:#fff;border-radius:8px;} QPushButton:hover{background:#D48806;}')
+        self.queue_btn.clicked.connect(self.on_toggle_queue)
+        path_layout.addWidget(self.queue_btn)
+        # 暂停/继续按钮，继续时从已下载的位置断点续传
+        self.pause_btn = QPushButton("暂停")
+        self.pause_btn.setStyleSheet('QPushButton{min-width:60px;max-width:90px;min-height:26px;max-height:32px;font-size:14px;background:#FAAD14;color:#fff;border-radius:8px;} QPushButton:hover{background:#D48806;}')
+        self.pause_btn.clicked.connect(self.on_pause_task)
+        path_layout.addWidget(self.pause_btn)
+        self.resume_btn = QPushButton("继续")
+        self.resume_btn.setStyleSheet('QPushButton{min-width:60px;max-width:90px;min-height:26px;max-height:32px;font-size:14px;background:#165DFF;color:#fff;border-radius:8px;} QPushButton:hover{background:#0E4FE1;}')
+        self.resume_btn.clicked.connect(self.on_resume_task)
+        path_layout.addWidget(self.resume_btn)
         path_layout.addStretch()
         layout.addLayout(path_layout)
         self.table = QTableWidget()
@@ -337,6 +526,36 @@ QProgressBar::chunk {
             self.manager.clear_tasks()
             self.refresh_table()
 
+    def selected_tasks(self):
+        rows = sorted(set([item.row() for item in self.table.selectedItems()]))
+        tasks = self.manager.get_tasks()
+        return [tasks[row] for row in rows if 0 <= row < len(tasks)]
+
+    def on_pause_task(self):
+        for t in self.selected_tasks():
+            self.manager.pause_task(t)
+        self.refresh_table()
+
+    def on_resume_task(self):
+        tasks = [t for t in self.selected_tasks()
+                 if t.status not in ('已完成', '排队中') and not t.running]
+        if not tasks:
+            QMessageBox.warning(self, "提示", "请先选择已暂停或失败的下载任务")
+            return
+        for t in tasks:
+            # 手动继续的任务优先于队列中的其它任务
+            self.manager.start_download(t, priority=-1)
+        self.refresh_table()
+
+    def on_toggle_queue(self):
+        if self.manager.queue_paused:
+            self.manager.resume_queue()
+            self.queue_btn.setText("全部暂停")
+        else:
+            self.manager.pause_queue()
+            self.queue_btn.setText("全部继续")
+        self.refresh_table()
+
     def on_delete_task(self):
         from PyQt5.QtWidgets import QMessageBox
         selected = self.table.selectedItems()
@@ -350,13 +569,13 @@ QProgressBar::chunk {
         reply = QMessageBox.question(self, "确认删除", f"确定要删除选中的 {len(selected_rows)} 个下载任务吗？\n正在下载的任务将被终止，未完成的文件会被删除。", QMessageBox.Yes | QMessageBox.No)
         if reply == QMessageBox.Yes:
             tasks = self.manager.get_tasks()
+            removed = []
             for i in sorted(selected_rows, reverse=True):
                 t = tasks[i]
                 # 终止线程
                 t.stop()
-                # 等待线程结束（如果在下载中）
-                if t.thread and t.thread.is_alive():
-                    t.thread.join(timeout=2)
+                # 等待工作线程结束该任务（如果在下载中）
+                self.manager.wait_stopped(t)
                 # 删除未完成文件
                 if t.status != '已完成':
                     local_path = os.path.join(t.save_path, t.file_name)
@@ -365,8 +584,9 @@ QProgressBar::chunk {
                             os.remove(local_path)
                         except Exception:
                             pass
-                del tasks[i]
-            self.manager.save_tasks()
+                    self.manager.downloader.discard_partial(local_path)
+                removed.append(t)
+            self.manager.remove_tasks(removed)
             self.refresh_table()
 
 def get_offline_tasks_file(username):
@@ -397,8 +617,8 @@ class OfflineTask:
 class OfflineTaskManager:
     def __init__(self, username=None):
         self.username = username or 'default'
+        self.lock = threading.RLock()  # 保护任务列表和写盘，save_tasks内部也会获取
         self.tasks = self.load_tasks()
-        self.lock = threading.Lock()
     def set_user(self, username):
         self.username = username
         self.tasks = self.load_tasks()
@@ -406,16 +626,31 @@ class OfflineTaskManager:
         tasks_file = get_offline_tasks_file(self.username)
         if os.path.exists(tasks_file):
             with open(tasks_file, 'r', encoding='utf-8') as f:
-                return [OfflineTask.from_dict(t) for t in json.load(f)]
-        return []
+                tasks = [OfflineTask.from_dict(t) for t in json.load(f)]
+        else:
+            tasks = []
+        self.tasks = tasks
+        self._rebuild_index()
+        return tasks
+    def _rebuild_index(self):
+        """task_id -> 任务 / 行号"""
+        self._by_id = {t.task_id: t for t in self.tasks}
+        self._rows = {t.task_id: row for row, t in enumerate(self.tasks)}
+    def get_task(self, task_id):
+        return self._by_id.get(task_id)
+    def get_row(self, task_id):
+        """任务在列表中的行号，不存在返回None"""
+        return self._rows.get(task_id)
     def save_tasks(self):
-        tasks_file = get_offline_tasks_file(self.username)
-        with open(tasks_file, 'w', encoding='utf-8') as f:
-            json.dump([t.to_dict() for t in self.tasks], f, ensure_ascii=False, indent=2)
+        with self.lock:
+            tasks_file = get_offline_tasks_file(self.username)
+            write_json_atomic(tasks_file, [t.to_dict() for t in self.tasks])
     def add_task(self, task_id, file_name, url):
         task = OfflineTask(task_id, file_name, url)
         with self.lock:
             self.tasks.append(task)
+            self._by_id[task_id] = task
+            self._rows[task_id] = len(self.tasks) - 1
             self.save_tasks()
         return task
     def get_tasks(self):
@@ -423,6 +658,7 @@ class OfflineTaskManager:
     def clear_tasks(self):
         with self.lock:
             self.tasks = []
+            self._rebuild_index()
             self.save_tasks()
             tasks_file = get_offline_tasks_file(self.username)
             if os.path.exists(tasks_file) and os.path.getsize(tasks_file) < 10:
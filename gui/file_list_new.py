@@ -1,12 +1,14 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QPushButton, QLineEdit, QLabel, QHeaderView, QComboBox, QDialog, QProgressBar, QApplication, QScrollArea, QMenu, QAction, QToolButton, QAbstractItemView, QMessageBox
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QLabel, QHeaderView, QComboBox, QDialog, QProgressBar, QApplication, QScrollArea, QMenu, QAction, QToolButton, QAbstractItemView, QMessageBox
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from core.file_api import FileApi
+from core.metadata_store import MetadataStore
 from gui.pagination import PaginationWidget
 from gui.file_list_workers import AutoLoadWorker
 from gui.file_list_ui import FileListUI
 from gui.file_list_operations import FileOperations
 from gui.upload_dialog import UploadDialog
 import os
+import time
 
 class FileListPage(QWidget):
     def __init__(self, get_token_func, parent=None):
@@ -15,13 +17,16 @@ class FileListPage(QWidget):
         self.api = FileApi()
         self.current_parent_id = 0
         self.file_list = []
-        self.file_list_cache = {}  # 新增缓存
+        self.file_list_cache = {}  # 内存缓存，parent_id -> (文件列表, 最近完整列举时间)
+        self.current_search = None  # 当前显示的搜索关键字，None表示目录列表
+        self.metadata = None  # 当前用户的本地目录镜像，由set_user创建
         self.folder_path = [(0, '根目录')]
         self.page_size = 100  # 直接最大100
         self.total = 0
         # 排序相关
         self.sort_column = 1  # 默认按文件名排序
         self.sort_order = Qt.AscendingOrder  # 默认升序
+        self.secondary_sorts = []  # 次要排序列[(列号, 排序方向), ...]，主排序列相同时依次比较
         # 自动加载工作线程
         self.auto_load_worker = None
         # 信息标签隐藏定时器
@@ -40,6 +45,35 @@ class FileListPage(QWidget):
         self.ui.init_ui()
         self.load_file_list()
 
+    def set_user(self, username):
+        """切换用户：使用该用户的本地目录镜像，清空内存缓存"""
+        self.file_list_cache = {}
+        self.metadata = MetadataStore(username) if username else None
+
+    def get_cached_folder(self, parent_id):
+        """
+        从内存缓存或本地目录镜像读取文件夹
+        :return: (文件列表, 最近完整列举时间)，没有缓存返回None
+        """
+        parent_id = int(parent_id)
+        cached = self.file_list_cache.get(parent_id)
+        if cached is not None and self.metadata and self.metadata.synced_at(parent_id) is None:
+            # 镜像已在别处作废（上传完成、回收站恢复），内存缓存随之失效
+            self.file_list_cache.pop(parent_id)
+            return None
+        if cached is None and self.metadata:
+            cached = self.metadata.get_folder(parent_id)
+            if cached is not None:
+                self.file_list_cache[parent_id] = cached
+        return cached
+
+    def cache_folder(self, parent_id, file_list):
+        """保存一次完整列举的结果到内存缓存和本地目录镜像"""
+        parent_id = int(parent_id)
+        self.file_list_cache[parent_id] = (file_list.copy(), time.time())
+        if self.metadata:
+            self.metadata.replace_folder(parent_id, file_list)
+
     def load_file_list(self, parent_id=None, search_data=None, reset_cursor=False):
         """加载文件列表"""
         token = self.get_token_func()
@@ -53,22 +87,27 @@ class FileListPage(QWidget):
             parent_id = 0
         else:
             parent_id = parent_id if parent_id is not None else self.current_parent_id
-        # 优先用缓存
-        if search_data is None and parent_id in self.file_list_cache:
-            self.file_list = self.file_list_cache[parent_id].copy()
+        # 优先用缓存（内存缓存或本地目录镜像），过期的镜像先显示再后台刷新
+        cached = self.get_cached_folder(parent_id) if search_data is None else None
+        if cached is not None:
+            self.file_list = cached[0].copy()
             self.total = len(self.file_list)
             self.current_parent_id = parent_id
+            self.current_search = None
             self.sort_column = 1
             self.sort_order = Qt.AscendingOrder
+            self.secondary_sorts = []
             self.ui.update_path_bar()
             self.refresh_table()
             self.info_label.setText(f"已加载全部文件（缓存），共{self.total}个")
             self.info_label.setVisible(True)
             # 1秒后自动隐藏信息标签
             self.info_hide_timer.start(1000)
+            if self.metadata is None or self.metadata.is_stale(cached[1]):
+                self.auto_load_all_files(parent_id)
             return
         page_size = self.page_size
-        self.table.setRowCount(0)
+        self.file_model.clear()
         self.table.setDisabled(True)
         self.info_label.setText("加载中...")
         self.info_label.setToolTip("")
@@ -113,7 +152,7 @@ class FileListPage(QWidget):
         if resp.get("code") != 0:
             self.info_label.setVisible(True)
             self.info_label.setText(f"获取失败: {resp.get('message')}")
-            self.table.setRowCount(0)
+            self.file_model.clear()
             return
         
         data = resp.get("data", {})
@@ -138,12 +177,11 @@ class FileListPage(QWidget):
         self.total = len(valid_files)
         self.file_list = valid_files.copy()  # 使用copy确保数据独立
         self.current_parent_id = parent_id
+        self.current_search = search_data
         # 每次加载新数据都重置排序状态，默认按文件名升序，文件夹优先
         self.sort_column = 1  # 默认按文件名
         self.sort_order = Qt.AscendingOrder
-        
-        # 应用默认排序：文件夹优先，然后按文件名排序
-        self.sort_file_list()
+        self.secondary_sorts = []
         
         # 路径追踪
         if not self.folder_path or self.folder_path[-1][0] != parent_id:
@@ -162,13 +200,16 @@ class FileListPage(QWidget):
         self.ui.update_path_bar()
         self.refresh_table()
         
-        # 检查是否需要自动加载更多文件
-        if self.total >= 100 and not search_data:
+        # 检查是否需要自动加载更多文件：以服务端的lastFileId判断是否已列举完，
+        # 过滤掉回收站条目后的数量不能说明文件夹是否只有一页
+        if data.get("lastFileId") != -1 and not search_data:
             # 自动加载所有文件
             self.auto_load_all_files(parent_id)
         else:
-            # 文件夹内文件少于100个，隐藏加载提示
+            # 第一页已是全部文件，隐藏加载提示
             self.info_label.setVisible(False)
+            if not search_data:
+                self.cache_folder(parent_id, valid_files)
 
     def auto_load_all_files(self, parent_id):
         """自动分批加载所有文件"""
@@ -184,7 +225,7 @@ class FileListPage(QWidget):
         # 创建新的工作线程
         self.auto_load_worker = AutoLoadWorker(self.api, token, parent_id, self.page_size, self)
         self.auto_load_worker.progress.connect(self.on_auto_load_progress)
-        self.auto_load_worker.finished.connect(self.on_auto_load_finished)
+        self.auto_load_worker.finished.connect(lambda file_list: self.on_auto_load_finished(file_list, parent_id))
         self.auto_load_worker.error.connect(self.on_auto_load_error)
         
         # 更新UI状态
@@ -198,15 +239,15 @@ class FileListPage(QWidget):
         """自动加载进度更新"""
         self.info_label.setText(f"已加载{count}个文件...")
     
-    def on_auto_load_finished(self, file_list):
+    def on_auto_load_finished(self, file_list, parent_id):
         """自动加载完成"""
+        self.cache_folder(parent_id, file_list)  # 写入缓存
+        if parent_id != self.current_parent_id:
+            # 加载期间已切换到其它目录，只更新缓存
+            return
         self.file_list = file_list.copy()
-        self.file_list_cache[self.current_parent_id] = file_list.copy()  # 写入缓存
         self.total = len(file_list)
         
-        # 应用排序：文件夹优先，然后按当前排序规则排序
-        self.sort_file_list()
-        
         self.info_label.setText(f"已加载全部文件，共{self.total}个")
         self.info_label.setVisible(True)
         self.refresh_table()
@@ -235,107 +276,108 @@ class FileListPage(QWidget):
 
     def clear_cache(self):
         """清除当前目录的缓存"""
-        if self.current_parent_id in self.file_list_cache:
-            del self.file_list_cache[self.current_parent_id]
+        if self.current_parent_id is None:
+            return
+        self.file_list_cache.pop(int(self.current_parent_id), None)
+        if self.metadata:
+            self.metadata.invalidate(self.current_parent_id)
     
+    def patch_cached_folder(self, parent_id, patch):
+        """对内存缓存中的文件夹列表原地执行patch(files)，没有缓存时跳过"""
+        cached = self.file_list_cache.get(int(parent_id))
+        if cached is not None:
+            patch(cached[0])
+
+    def take_files(self, file_ids):
+        """从当前列表和来源文件夹的缓存中取出文件，只删除对应的表格行，返回取出的文件"""
+        ids = {str(i) for i in file_ids}
+        rows = [self.file_model.row_of(i) for i in ids]
+        taken = self.file_model.remove_rows([row for row in rows if row >= 0])
+        self.file_list = [f for f in self.file_list if str(f.get('fileId')) not in ids]
+        self.total = len(self.file_list)
+        
+        def drop(files):
+            files[:] = [f for f in files if str(f.get('fileId')) not in ids]
+        
+        # 搜索结果可能来自不同目录，按文件自身的父目录修补缓存
+        for parent_id in {f.get('parentFileId', self.current_parent_id) for f in taken} | {self.current_parent_id}:
+            if parent_id is not None:
+                self.patch_cached_folder(parent_id, drop)
+        return taken
+
+    def apply_removed(self, file_ids):
+        """文件移入回收站后修补列表和缓存"""
+        self.take_files(file_ids)
+        if self.metadata:
+            self.metadata.remove(file_ids)
+
+    def apply_moved(self, file_ids, to_parent_id):
+        """文件移动后修补来源和目标文件夹的缓存"""
+        to_parent_id = int(to_parent_id)
+        # 移动到原目录的文件不需要修补
+        moved = self.take_files([
+            file_id for file_id, f in ((i, self.file_model.file_by_id(i)) for i in file_ids)
+            if f is None or str(f.get('parentFileId', self.current_parent_id)) != str(to_parent_id)
+        ])
+        for f in moved:
+            f['parentFileId'] = to_parent_id
+        
+        def add(files):
+            existing = {str(f.get('fileId')) for f in files}
+            files.extend(f for f in moved if str(f.get('fileId')) not in existing)
+        
+        self.patch_cached_folder(to_parent_id, add)
+        if self.metadata:
+            self.metadata.upsert(moved, to_parent_id)
+
+    def apply_renamed(self, file_id, new_name):
+        """文件重命名后修补缓存，只重绘对应的表格行"""
+        parent_id = self.current_parent_id
+        row = self.file_model.row_of(file_id)
+        if row >= 0:
+            f = self.file_model.file_at(row)
+            f['filename'] = new_name
+            self.file_model.refresh_row(row)
+            parent_id = f.get('parentFileId', parent_id)
+        
+        def rename(files):
+            for f in files:
+                if str(f.get('fileId')) == str(file_id):
+                    f['filename'] = new_name
+        
+        if parent_id is not None:
+            self.patch_cached_folder(parent_id, rename)
+        if self.metadata:
+            self.metadata.rename(file_id, new_name)
+
+    def apply_created(self, dir_id, name, parent_id):
+        """新建目录后把它加入缓存，当前显示的正是该目录时按排序位置插入一行"""
+        file_info = {
+            'fileId': dir_id, 'filename': name, 'type': 1, 'size': 0, 'etag': '', 'status': 0,
+            'parentFileId': parent_id, 'trashed': 0, 'createAt': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self.patch_cached_folder(parent_id, lambda files: files.append(dict(file_info)))
+        if self.metadata:
+            self.metadata.upsert([file_info], parent_id)
+        if parent_id != self.current_parent_id or self.current_search:
+            return
+        self.file_list.append(file_info)
+        self.total = len(self.file_list)
+        self.file_model.insert_file(self.file_model.rowCount(), file_info)
+        # 重排只调整行号映射，新行随之移动到排序位置
+        self.sort_file_list()
+
     def clear_file_list(self):
         """清除文件列表显示"""
-        self.table.setRowCount(0)
+        self.file_model.clear()
         self.current_parent_id = None
 
     def refresh_table(self):
-        """刷新表格显示"""
-        if not self.file_list:
-            self.table.setRowCount(0)
-            return
-            
-        # 验证数据完整性
-        valid_files = []
-        for i, file_info in enumerate(self.file_list):
-            if isinstance(file_info, dict) and 'fileId' in file_info and 'filename' in file_info:
-                # 确保所有必要字段都有默认值
-                file_info.setdefault('type', 0)
-                file_info.setdefault('size', 0)
-                file_info.setdefault('status', 0)
-                file_info.setdefault('createAt', '')
-                valid_files.append(file_info)
-            else:
-                print(f"警告：发现无效文件数据（第{i}个）：{file_info}")
-        
-        if len(valid_files) != len(self.file_list):
-            print(f"警告：{len(self.file_list) - len(valid_files)} 个文件数据无效，已过滤")
-            self.file_list = valid_files.copy()  # 使用copy确保数据独立
-        
-        self.table.setRowCount(len(self.file_list))
-        for row, file_info in enumerate(self.file_list):
-            try:
-                # 文件ID
-                file_id = str(file_info.get('fileId', ''))
-                id_item = QTableWidgetItem(file_id)
-                id_item.setTextAlignment(Qt.AlignCenter)
-                self.table.setItem(row, 0, id_item)
-                
-                # 文件名
-                filename = file_info.get('filename', '')
-                filename_item = QTableWidgetItem(filename)
-                filename_item.setToolTip(filename)  # 设置tooltip，显示完整文件名
-                # 为排序设置数据
-                filename_item.setData(Qt.UserRole, filename.lower())
-                self.table.setItem(row, 1, filename_item)
-                
-                # 扩展名
-                filename = file_info.get('filename', '')
-                if file_info.get('type') == 1:  # 文件夹
-                    extension = "文件夹"
-                else:
-                    # 提取文件扩展名
-                    import os
-                    _, ext = os.path.splitext(filename)
-                    extension = ext[1:].upper() if ext else "无扩展名"
-                extension_item = QTableWidgetItem(extension)
-                extension_item.setTextAlignment(Qt.AlignCenter)
-                self.table.setItem(row, 2, extension_item)
-                
-                # 类型
-                file_type = "文件夹" if file_info.get('type') == 1 else "文件"
-                type_item = QTableWidgetItem(file_type)
-                type_item.setData(Qt.UserRole, file_info.get('type', 0))
-                type_item.setTextAlignment(Qt.AlignCenter)
-                self.table.setItem(row, 3, type_item)
-                
-                # 大小
-                size = file_info.get('size', 0)
-                size_str = self.format_size(size)
-                size_item = QTableWidgetItem(size_str)
-                size_item.setData(Qt.UserRole, size)  # 用于排序的原始大小
-                size_item.setTextAlignment(Qt.AlignCenter)
-                self.table.setItem(row, 4, size_item)
-                
-                # 状态
-                status = file_info.get('status', 0)
-                status_text = '正常' if status < 100 else '审核驳回'
-                status_item = QTableWidgetItem(status_text)
-                status_item.setTextAlignment(Qt.AlignCenter)
-                self.table.setItem(row, 5, status_item)
-                
-                # 创建时间
-                create_time = file_info.get('createAt', '')
-                create_time_item = QTableWidgetItem(create_time)
-                create_time_item.setData(Qt.UserRole, create_time)  # 用于排序的时间
-                self.table.setItem(row, 6, create_time_item)
-                
-            except Exception as e:
-                print(f"警告：处理第 {row} 行数据时出错：{e}")
-                print(f"问题数据：{file_info}")
-                # 填充空数据
-                for col in range(7):
-                    self.table.setItem(row, col, QTableWidgetItem(""))
-        
-        # 应用当前排序（如果有排序状态）
-        if hasattr(self, 'sort_column') and hasattr(self, 'sort_order'):
-            self.apply_current_sort()
-            # 更新排序状态指示器
-            self.update_sort_indicator()
+        """把file_list交给表格模型显示，并按当前排序列排序"""
+        self.file_model.set_files(self.file_list)
+        self.sort_file_list()
+        # 更新排序状态指示器
+        self.update_sort_indicator()
 
     def on_header_clicked(self, logical_index):
         """处理表格头部点击事件"""
@@ -343,95 +385,39 @@ class FileListPage(QWidget):
         if logical_index == self.sort_column:
             self.sort_order = Qt.DescendingOrder if self.sort_order == Qt.AscendingOrder else Qt.AscendingOrder
         else:
+            # 原来的主排序列降为次要排序列，保留最近的两列
+            previous = [(self.sort_column, self.sort_order)] + self.secondary_sorts
+            self.secondary_sorts = [s for s in previous if s[0] != logical_index][:2]
             self.sort_column = logical_index
             self.sort_order = Qt.AscendingOrder
-        # 只对当前file_list排序
+        # 只重排表格行，不重建数据
         self.sort_file_list()
-        self.refresh_table()
+        self.update_sort_indicator()
 
     def restore_header_texts(self):
         """恢复所有表头文本为原始状态"""
         for i, header_text in enumerate(self.original_headers):
-            if i < self.table.columnCount():
-                self.table.horizontalHeaderItem(i).setText(header_text)
+            self.file_model.set_header_text(i, header_text)
 
     def sort_file_list(self):
-        """对文件列表进行排序，文件夹始终排在前面"""
-        if not self.file_list:
-            return
-        
-        original_files = self.file_list.copy()
-        reverse = (self.sort_order == Qt.DescendingOrder)
-        
-        try:
-            # 数据验证
-            if not all(isinstance(f, dict) and 'fileId' in f and 'filename' in f for f in self.file_list):
-                print("警告：排序前数据验证失败，跳过排序")
-                return
-            
-            # 定义排序键函数：文件夹优先，然后按指定列排序
-            def get_sort_key(item):
-                # 文件夹类型为1，文件类型为0，所以 type != 1 会让文件夹排在前面
-                is_folder = item.get('type', 0) == 1
-                
-                if self.sort_column == 0:  # 文件ID
-                    return (not is_folder, str(item.get('fileId', '')).lower())
-                elif self.sort_column == 1:  # 文件名
-                    return (not is_folder, item.get('filename', '').lower())
-                elif self.sort_column == 2:  # 扩展名
-                    # 提取扩展名用于排序
-                    filename = item.get('filename', '')
-                    if item.get('type') == 1:  # 文件夹
-                        ext = "文件夹"
-                    else:
-                        import os
-                        _, ext = os.path.splitext(filename)
-                        ext = ext[1:].upper() if ext else "无扩展名"
-                    return (not is_folder, ext)
-                elif self.sort_column == 3:  # 类型
-                    return (not is_folder, item.get('type', 0))
-                elif self.sort_column == 4:  # 大小
-                    return (not is_folder, item.get('size', 0))
-                elif self.sort_column == 5:  # 状态
-                    return (not is_folder, item.get('status', 0))
-                elif self.sort_column == 6:  # 创建时间
-                    return (not is_folder, item.get('createAt', ''))
-                else:
-                    # 默认按文件名排序
-                    return (not is_folder, item.get('filename', '').lower())
-            
-            # 执行排序
-            self.file_list.sort(key=get_sort_key, reverse=reverse)
-            
-            # 验证排序结果
-            if len(self.file_list) != len(original_files):
-                self.file_list = original_files
-                print("警告：排序过程中数据丢失，已恢复原始数据")
-                return
-                
-            for i, file_info in enumerate(self.file_list):
-                if not isinstance(file_info, dict) or 'fileId' not in file_info:
-                    print(f"警告：排序后第 {i} 个文件数据无效，恢复原始数据")
-                    self.file_list = original_files
-                    return
-                    
-        except Exception as e:
-            self.file_list = original_files
-            print(f"排序出错：{e}，已恢复原始数据")
-
-    def apply_current_sort(self):
-        """应用当前排序"""
-        # 禁用QTableWidget的sortItems，保持表格和file_list顺序一致
-        pass
+        """按当前排序列和次要排序列重排表格行，文件夹始终排在前面；最后按文件名区分"""
+        levels = [(column, order == Qt.DescendingOrder)
+                  for column, order in [(self.sort_column, self.sort_order)] + self.secondary_sorts]
+        if all(column != 1 for column, _ in levels):
+            levels.append((1, False))
+        self.file_model.sort_rows(levels)
 
     def get_file_by_row(self, row):
-        """通过表格行号获取文件信息"""
-        # 通过表格行号获取fileId，再反查file_list
-        file_id = self.table.item(row, 0).text()
-        for f in self.file_list:
-            if str(f.get('fileId')) == file_id:
-                return f
-        return None
+        """通过表格行号获取文件信息，模型保存了行号到文件的映射，排序后依然有效"""
+        return self.file_model.file_at(row)
+
+    def get_file_by_id(self, file_id):
+        """通过文件ID获取当前表格中的文件信息"""
+        return self.file_model.file_by_id(file_id)
+
+    def get_selected_rows(self):
+        """选中的行号（升序）"""
+        return sorted(index.row() for index in self.table.selectionModel().selectedRows())
 
     def on_cell_double_clicked(self, row, col):
         """单元格双击事件"""
@@ -466,6 +452,8 @@ class FileListPage(QWidget):
 
     def on_refresh(self):
         """刷新"""
+        # 刷新时跳过缓存，重新列举
+        self.clear_cache()
         self.load_file_list(parent_id=self.current_parent_id)
 
     def on_select_all(self):
@@ -475,8 +463,7 @@ class FileListPage(QWidget):
     def update_sort_indicator(self):
         """更新排序状态指示器"""
         # 清除所有列的排序指示器
-        for i in range(self.table.columnCount()):
-            self.table.horizontalHeader().setSortIndicatorShown(False)
+        self.table.horizontalHeader().setSortIndicatorShown(False)
         
         # 自定义排序指示器：在表头文本右边添加箭头
         if self.file_list:
@@ -491,7 +478,7 @@ class FileListPage(QWidget):
             
             # 更新表头文本，在右边添加箭头
             new_header_text = header_text + arrow
-            self.table.horizontalHeaderItem(self.sort_column).setText(new_header_text)
+            self.file_model.set_header_text(self.sort_column, new_header_text)
             
             # 设置排序列的背景色
             self.table.horizontalHeader().setStyleSheet("""
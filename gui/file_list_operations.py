@@ -1,10 +1,12 @@
 from PyQt5.QtWidgets import QMessageBox, QDialog, QFileDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QScrollArea, QWidget, QApplication
 from PyQt5.QtCore import QTimer
-from gui.file_list_workers import BatchRenameWorker, FolderDownloadWorker
+from gui.file_list_workers import BatchRenameWorker, FolderDownloadWorker, BulkOperationWorker
 from gui.file_list_dialogs import ProgressDialog, RenameDialog, MultiRenameDialog
 # from gui.batch_rename import BatchRenameDialog as AdvancedBatchRenameDialog
 from gui.move_folder_dialog import MoveFolderDialog
 from core.file_api import FileApi
+from core.bulk_ops import failed_ids, succeeded_ids, summarize
+from core.url_resolver import get_url_resolver
 import os
 
 class FileOperations:
@@ -26,11 +28,10 @@ class FileOperations:
                 return
             parent_id = self.file_list_page.current_parent_id
             try:
-                resp = self.api.create_directory(token, dir_name.strip(), parent_id)
-                if resp:
+                dir_id = self.api.create_directory(token, dir_name.strip(), parent_id)
+                if dir_id:
                     QMessageBox.information(self.file_list_page, "成功", f"目录 '{dir_name}' 创建成功！")
-                    self.file_list_page.clear_cache()  # 清除缓存
-                    self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
+                    self.file_list_page.apply_created(dir_id, dir_name.strip(), parent_id)
                 else:
                     QMessageBox.warning(self.file_list_page, "失败", "目录创建失败")
             except Exception as e:
@@ -38,11 +39,10 @@ class FileOperations:
     
     def on_rename(self):
         """重命名操作"""
-        selected = self.file_list_page.table.selectedItems()
-        if not selected:
+        selected_rows = self.file_list_page.get_selected_rows()
+        if not selected_rows:
             QMessageBox.warning(self.file_list_page, "提示", "请先选择要重命名的文件/文件夹")
             return
-        selected_rows = list(set([item.row() for item in selected]))
         if len(selected_rows) == 1:
             row = selected_rows[0]
             f = self.file_list_page.get_file_by_row(row)
@@ -64,8 +64,7 @@ class FileOperations:
                     try:
                         self.api.rename_file(token, file_id, new_name)
                         QMessageBox.information(self.file_list_page, "成功", f"重命名成功！")
-                        self.file_list_page.clear_cache()  # 清除缓存
-                        self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
+                        self.file_list_page.apply_renamed(file_id, new_name)
                     except Exception as e:
                         QMessageBox.critical(self.file_list_page, "错误", f"重命名失败: {e}")
         elif len(selected_rows) > 1:
@@ -112,18 +111,19 @@ class FileOperations:
                     for file_id, edit, old_name in self.line_edits:
                         new_name = edit.text().strip()
                         if new_name and new_name != old_name:
-                            result.append(f"{file_id}|{new_name}")
+                            result.append({'file_id': file_id, 'old_name': old_name, 'new_name': new_name})
                     return result
-            file_infos = [(int(self.file_list_page.table.item(row, 0).text()), self.file_list_page.table.item(row, 1).text()) for row in selected_rows]
+            file_infos = [(f.get('fileId'), f.get('filename', '')) for f in map(self.file_list_page.get_file_by_row, selected_rows)]
             dlg = BatchRenameDialog(file_infos, self.file_list_page)
             if dlg.exec_() == QDialog.Accepted:
                 rename_list = dlg.get_rename_list()
                 token = self.get_token_func()
                 api = FileApi()
                 progress_dlg = ProgressDialog("批量重命名进度", len(rename_list), self.file_list_page)
-                worker = BatchRenameWorker(api, token, rename_list, batch_size=5)  # 并发数改为5
+                worker = BatchRenameWorker(api, token, rename_list)
                 def on_progress(done, total):
                     progress_dlg.setValue(done)
+                errors = []
                 def on_finished(success, fail):
                     progress_dlg.setValue(len(rename_list))
                     progress_dlg.setLabelText(f"完成，成功{success}个，失败{fail}个。")
@@ -131,10 +131,13 @@ class FileOperations:
                     import time
                     time.sleep(1.2)
                     progress_dlg.accept()
-                    QMessageBox.information(self.file_list_page, "批量重命名", f"重命名完成，成功{success}个，失败{fail}个。")
-                    self.file_list_page.clear_cache()  # 清除缓存
-                    self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
+                    message = f"重命名完成，成功{success}个，失败{fail}个。"
+                    if errors:
+                        message += f"\n失败原因: {errors[0]}"
+                    QMessageBox.information(self.file_list_page, "批量重命名", message)
+                    self.apply_rename_results(worker)
                 worker.progress.connect(on_progress)
+                worker.error.connect(errors.append)
                 worker.finished.connect(on_finished)
                 progress_dlg.cancel_btn.clicked.connect(worker.stop)
                 worker.start()
@@ -142,11 +145,10 @@ class FileOperations:
     
     def on_delete(self):
         """删除操作"""
-        selected = self.file_list_page.table.selectedItems()
-        if not selected:
+        selected_rows = self.file_list_page.get_selected_rows()
+        if not selected_rows:
             QMessageBox.warning(self.file_list_page, "提示", "请先选择要删除的文件/文件夹")
             return
-        selected_rows = list(set([item.row() for item in selected]))
         file_ids = []
         for row in selected_rows:
             f = self.file_list_page.get_file_by_row(row)
@@ -161,22 +163,44 @@ class FileOperations:
             if not token:
                 QMessageBox.warning(self.file_list_page, "提示", "请先登录/选择用户")
                 return
-            try:
-                self.api.move_to_trash(token, file_ids)
-                QMessageBox.information(self.file_list_page, "成功", f"删除成功，已移入回收站！")
-                self.file_list_page.clear_cache()  # 清除缓存
-                self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
-            except Exception as e:
-                QMessageBox.critical(self.file_list_page, "错误", f"删除失败: {e}")
+            self.run_bulk("删除", lambda ids: self.api.bulk_move_to_trash(token, ids), file_ids,
+                          "删除成功，已移入回收站！", self.file_list_page.apply_removed)
+    
+    def run_bulk(self, action, func, file_ids, success_text, apply):
+        """在后台线程执行批量操作func(file_ids)，完成后显示结果并修补成功的文件"""
+        self.file_list_page.info_label.setText(f"正在{action}{len(file_ids)}个文件/文件夹...")
+        self.file_list_page.info_label.setVisible(True)
+        self.file_list_page.bulk_worker = BulkOperationWorker(func, file_ids, self.file_list_page)
+        
+        def on_finished(results):
+            self.file_list_page.info_label.setVisible(False)
+            self.show_bulk_result(action, results, success_text, apply)
+        
+        self.file_list_page.bulk_worker.finished.connect(on_finished)
+        self.file_list_page.bulk_worker.start()
+    
+    def show_bulk_result(self, action, results, success_text, apply):
+        """显示批量操作结果：全部成功时沿用原提示，有失败时列出成功和失败数量；然后用apply修补成功的文件"""
+        if failed_ids(results):
+            QMessageBox.warning(self.file_list_page, "部分失败", summarize(action, results))
+        else:
+            QMessageBox.information(self.file_list_page, "成功", success_text)
+        apply(succeeded_ids(results))
+    
+    def apply_rename_results(self, worker):
+        """批量重命名结束后，只修补重命名成功的文件"""
+        for item in worker.rename_list:
+            ok, _ = worker.results.get(item['file_id'], (False, ''))
+            if ok:
+                self.file_list_page.apply_renamed(item['file_id'], item['new_name'])
     
     def on_move(self):
         """移动操作"""
-        selected = self.file_list_page.table.selectedItems()
-        if not selected:
+        selected_rows = self.file_list_page.get_selected_rows()
+        if not selected_rows:
             QMessageBox.warning(self.file_list_page, "提示", "请先选择要移动的文件/文件夹")
             return
         
-        selected_rows = list(set([item.row() for item in selected]))
         file_ids = []
         for row in selected_rows:
             f = self.file_list_page.get_file_by_row(row)
@@ -198,21 +222,15 @@ class FileOperations:
         if dlg.exec_() == MoveFolderDialog.Accepted:
             to_parent_id = dlg.get_selected_folder_id()
             if to_parent_id is not None:
-                try:
-                    self.api.move_files(token, file_ids, to_parent_id)
-                    QMessageBox.information(self.file_list_page, "成功", f"移动成功！")
-                    self.file_list_page.clear_cache()  # 清除缓存
-                    self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
-                except Exception as e:
-                    QMessageBox.critical(self.file_list_page, "错误", f"移动失败: {e}")
+                self.run_bulk("移动", lambda ids: self.api.bulk_move_files(token, ids, to_parent_id), file_ids,
+                              "移动成功！", lambda ids: self.file_list_page.apply_moved(ids, to_parent_id))
     
     def on_download(self):
         """下载操作"""
-        selected = self.file_list_page.table.selectedItems()
-        if not selected:
+        selected_rows = self.file_list_page.get_selected_rows()
+        if not selected_rows:
             QMessageBox.warning(self.file_list_page, "提示", "请先选择要下载的文件或文件夹（仅支持单选）")
             return
-        selected_rows = list(set([item.row() for item in selected]))
         if len(selected_rows) != 1:
             QMessageBox.warning(self.file_list_page, "提示", "请只选择一个文件或文件夹进行下载")
             return
@@ -258,7 +276,7 @@ class FileOperations:
     def download_file(self, file_id, file_name, download_manager, token, show_message=True):
         """下载单个文件"""
         try:
-            url = self.api.get_download_url(token, file_id)
+            url = get_url_resolver().resolve(token, file_id)
             # 推送任务到下载队列并启动
             task = download_manager.add_task(file_id, file_name, url)
             download_manager.start_download(task)
@@ -298,7 +316,7 @@ class FileOperations:
     
     def on_batch_rename(self):
         """批量重命名操作"""
-        selected_rows = self.file_list_page.table.selectionModel().selectedRows()
+        selected_rows = self.file_list_page.get_selected_rows()
         if not selected_rows:
             QMessageBox.warning(self.file_list_page, "提示", "请先选择要批量重命名的文件/文件夹")
             return
@@ -309,8 +327,7 @@ class FileOperations:
             return
         
         file_infos = []
-        for idx in selected_rows:
-            row = idx.row()
+        for row in selected_rows:
             f = self.file_list_page.get_file_by_row(row)
             if f:
                 file_infos.append({
@@ -337,9 +354,10 @@ class FileOperations:
             
             api = FileApi()
             progress_dlg = ProgressDialog("批量重命名进度", len(rename_list), self.file_list_page)
-            worker = BatchRenameWorker(api, token, rename_list, batch_size=5)  # 并发数改为5
+            worker = BatchRenameWorker(api, token, rename_list)
             def on_progress(done, total):
                 progress_dlg.setValue(done)
+            errors = []
             def on_finished(success, fail):
                 progress_dlg.setValue(len(rename_list))
                 progress_dlg.setLabelText(f"完成，成功{success}个，失败{fail}个。")
@@ -347,10 +365,13 @@ class FileOperations:
                 import time
                 time.sleep(1.2)
                 progress_dlg.accept()
-                QMessageBox.information(self.file_list_page, "批量重命名", f"重命名完成，成功{success}个，失败{fail}个。")
-                self.file_list_page.clear_cache()  # 清除缓存
-                self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
+                message = f"重命名完成，成功{success}个，失败{fail}个。"
+                if errors:
+                    message += f"\n失败原因: {errors[0]}"
+                QMessageBox.information(self.file_list_page, "批量重命名", message)
+                self.apply_rename_results(worker)
             worker.progress.connect(on_progress)
+            worker.error.connect(errors.append)
             worker.finished.connect(on_finished)
             progress_dlg.cancel_btn.clicked.connect(worker.stop)
             worker.start()
@@ -368,10 +389,5 @@ class FileOperations:
             if not token:
                 QMessageBox.warning(self.file_list_page, "提示", "请先登录/选择用户")
                 return
-            try:
-                self.api.move_to_trash(token, harmony_file_ids)
-                QMessageBox.information(self.file_list_page, "成功", f"删除成功，已移入回收站！")
-                self.file_list_page.clear_cache()  # 清除缓存
-                self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
-            except Exception as e:
-                QMessageBox.critical(self.file_list_page, "错误", f"删除失败: {e}") 
\ No newline at end of file
+            self.run_bulk("删除", lambda ids: self.api.bulk_move_to_trash(token, ids), harmony_file_ids,
+                          "删除成功，已移入回收站！", self.file_list_page.apply_removed) 
\ No newline at end of file
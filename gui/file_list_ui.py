@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, 
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableView, 
                              QPushButton, QLineEdit, QLabel, QHeaderView, QComboBox, QMenu, 
                              QAction, QToolButton, QAbstractItemView, QGraphicsDropShadowEffect, QDialog, QMessageBox, QFileDialog)
 from PyQt5.QtCore import Qt, QTimer
@@ -7,6 +7,7 @@ from PyQt5.QtGui import QCursor, QPixmap, QPainter, QPen, QBrush, QColor
 from gui.file_list_workers import AutoLoadWorker
 from gui.file_list_dialogs import RenameDialog, MultiRenameDialog, ProgressDialog
 from gui.file_list_operations import FileOperations
+from gui.file_table_model import FileTableModel
 from gui.batch_rename import BatchRenameDialog as AdvancedBatchRenameDialog
 from gui.move_folder_dialog import MoveFolderDialog
 from gui.upload_dialog import UploadDialog
@@ -147,9 +148,12 @@ class FileListUI:
         
         # 文件表格
         layout.addSpacing(18)
-        self.file_list_page.table = QTableWidget()
-        self.file_list_page.table.setColumnCount(7)
-        self.file_list_page.table.setHorizontalHeaderLabels(["文件ID", "文件名", "扩展名", "类型", "大小", "状态", "创建时间"])
+        self.file_list_page.table = QTableView()
+        # 表格数据由模型按需提供，不为每个单元格创建QTableWidgetItem
+        self.file_list_page.file_model = FileTableModel(
+            self.file_list_page.format_size, ["文件ID", "文件名", "扩展名", "类型", "大小", "状态", "创建时间"], self.file_list_page
+        )
+        self.file_list_page.table.setModel(self.file_list_page.file_model)
         
         # 设置列宽模式
         self.file_list_page.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
@@ -164,8 +168,8 @@ class FileListUI:
         self.file_list_page.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
         self.file_list_page.table.setColumnWidth(1, 400)  # 设置文件名列最小宽度为400像素
         
-        self.file_list_page.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.file_list_page.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.file_list_page.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.file_list_page.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.file_list_page.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.file_list_page.table.setAlternatingRowColors(True)
         
@@ -184,7 +188,7 @@ class FileListUI:
         self.setup_select_all_corner()
         
         self.file_list_page.table.setStyleSheet("""
-QTableWidget {
+QTableView {
     border-radius: 10px;
     border: 1.2px solid #d0d7de;
     background: #fafdff;
@@ -225,16 +229,16 @@ QHeaderView::down-arrow {
     width: 0px;
     height: 0px;
 }
-QTableWidget::item {
+QTableView::item {
     border-radius: 6px;
     padding: 6px 8px;
 }
-QTableWidget::item:selected {
+QTableView::item:selected {
     background: qlineargradient(x1:0, y1:0, x2:1, y2:0, stop:0 #e6f7ff, stop:1 #cce7ff);
     color: #165DFF;
     border: 1.2px solid #165DFF;
 }
-QTableWidget::item:hover {
+QTableView::item:hover {
     background: #f0faff;
 }
 QCornerButton::section {
@@ -270,7 +274,7 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
     width: 0px;
 }
 """)
-        self.file_list_page.table.cellDoubleClicked.connect(self.file_list_page.on_cell_double_clicked)
+        self.file_list_page.table.doubleClicked.connect(lambda index: self.file_list_page.on_cell_double_clicked(index.row(), index.column()))
         self.file_list_page.table.setMinimumHeight(int(self.file_list_page.table.sizeHint().height() * 1.3))
         shadow = QGraphicsDropShadowEffect(self.file_list_page.table)
         shadow.setBlurRadius(16)
@@ -448,8 +452,7 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
             return
         row = index.row()
         # 获取选中的行
-        selected = self.file_list_page.table.selectedItems()
-        selected_rows = list(set([item.row() for item in selected]))
+        selected_rows = self.file_list_page.get_selected_rows()
         
         # 如果右击的行不在选中行中，则只选中该行
         if row not in selected_rows:
@@ -460,7 +463,7 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
         # 支持单选和多选
         if len(selected_rows) >= 1:
             # 获取第一个选中项的类型作为参考
-            file_type = self.file_list_page.table.item(selected_rows[0], 3).text()
+            file_type = "文件夹" if self.file_list_page.get_file_by_row(selected_rows[0]).get('type') == 1 else "文件"
             menu = QMenu(self.file_list_page.table)
             
             # 设置菜单样式，与文件列表UI协调
@@ -500,7 +503,7 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
                 copy_id_action = QAction('复制文件夹ID', self.file_list_page.table)
                 
                 def do_copy():
-                    file_id = self.file_list_page.table.item(selected_rows[0], 0).text()
+                    file_id = str(self.file_list_page.get_file_by_row(selected_rows[0]).get('fileId'))
                     QApplication.clipboard().setText(file_id)
                     QMessageBox.information(self.file_list_page, '提示', f'文件夹ID已复制：{file_id}')
                 copy_id_action.triggered.connect(do_copy)
@@ -534,8 +537,7 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
                             try:
                                 self.file_list_page.api.rename_file(token, file_id, new_name)
                                 QMessageBox.information(self.file_list_page, "成功", f"重命名成功！")
-                                self.file_list_page.clear_cache()  # 清除缓存
-                                self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
+                                self.file_list_page.apply_renamed(file_id, new_name)
                             except Exception as e:
                                 QMessageBox.critical(self.file_list_page, "错误", f"重命名失败: {e}")
                 else:
@@ -566,20 +568,22 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
                             api = FileApi()
                             progress_dlg = ProgressDialog("重命名进度", len(rename_list), self.file_list_page)
                             from gui.file_list_workers import BatchRenameWorker
-                            worker = BatchRenameWorker(api, token, rename_list, batch_size=5)
+                            worker = BatchRenameWorker(api, token, rename_list)
                             
                             def on_progress(done, total):
                                 progress_dlg.setValue(done)
                             
+                            errors = []
                             def on_finished(success, fail):
                                 progress_dlg.setValue(len(rename_list))
-                                progress_dlg.setLabelText(f"完成，成功{success}个，失败{fail}个。")
+                                text = f"完成，成功{success}个，失败{fail}个。"
+                                progress_dlg.setLabelText(text + (f"\n失败原因: {errors[0]}" if errors else ""))
                                 QApplication.processEvents()
                                 QTimer.singleShot(1500, progress_dlg.close)
-                                self.file_list_page.clear_cache()  # 清除缓存
-                                self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
+                                self.file_list_page.operations.apply_rename_results(worker)
                             
                             worker.progress.connect(on_progress)
+                            worker.error.connect(errors.append)
                             worker.finished.connect(on_finished)
                             worker.start()
                             progress_dlg.exec_()
@@ -625,20 +629,22 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
                                 api = FileApi()
                                 progress_dlg = ProgressDialog("批量重命名进度", len(rename_list), self.file_list_page)
                                 from gui.file_list_workers import BatchRenameWorker
-                                worker = BatchRenameWorker(api, token, rename_list, batch_size=5)
+                                worker = BatchRenameWorker(api, token, rename_list)
                                 
                                 def on_progress(done, total):
                                     progress_dlg.setValue(done)
                                 
+                                errors = []
                                 def on_finished(success, fail):
                                     progress_dlg.setValue(len(rename_list))
-                                    progress_dlg.setLabelText(f"完成，成功{success}个，失败{fail}个。")
+                                    text = f"完成，成功{success}个，失败{fail}个。"
+                                    progress_dlg.setLabelText(text + (f"\n失败原因: {errors[0]}" if errors else ""))
                                     QApplication.processEvents()
                                     QTimer.singleShot(1500, progress_dlg.close)
-                                    self.file_list_page.clear_cache()  # 清除缓存
-                                    self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
+                                    self.file_list_page.operations.apply_rename_results(worker)
                                 
                                 worker.progress.connect(on_progress)
+                                worker.error.connect(errors.append)
                                 worker.finished.connect(on_finished)
                                 worker.start()
                                 progress_dlg.exec_()
@@ -671,13 +677,9 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
                     if not token:
                         QMessageBox.warning(self.file_list_page, "提示", "请先登录/选择用户")
                         return
-                    try:
-                        self.file_list_page.api.move_to_trash(token, file_ids)
-                        QMessageBox.information(self.file_list_page, "成功", f"删除成功，已移入回收站！")
-                        self.file_list_page.clear_cache()  # 清除缓存
-                        self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
-                    except Exception as e:
-                        QMessageBox.critical(self.file_list_page, "错误", f"删除失败: {e}")
+                    self.file_list_page.operations.run_bulk(
+                        "删除", lambda ids: self.file_list_page.api.bulk_move_to_trash(token, ids), file_ids,
+                        "删除成功，已移入回收站！", self.file_list_page.apply_removed)
             delete_action.triggered.connect(do_delete)
             menu.addAction(delete_action)
             
@@ -705,13 +707,9 @@ QScrollBar::add-line:horizontal, QScrollBar::sub-line:horizontal {
                 if dlg.exec_() == MoveFolderDialog.Accepted:
                     to_parent_id = dlg.get_selected_folder_id()
                     if to_parent_id is not None:
-                        try:
-                            self.file_list_page.api.move_files(token, file_ids, to_parent_id)
-                            QMessageBox.information(self.file_list_page, "成功", f"移动成功！")
-                            self.file_list_page.clear_cache()  # 清除缓存
-                            self.file_list_page.load_file_list(parent_id=self.file_list_page.current_parent_id)
-                        except Exception as e:
-                            QMessageBox.critical(self.file_list_page, "错误", f"移动失败: {e}")
+                        self.file_list_page.operations.run_bulk(
+                            "移动", lambda ids: self.file_list_page.api.bulk_move_files(token, ids, to_parent_id), file_ids,
+                            "移动成功！", lambda ids: self.file_list_page.apply_moved(ids, to_parent_id))
             move_action.triggered.connect(do_move)
             menu.addAction(move_action)
             
@@ -1,46 +1,109 @@
 from PyQt5.QtCore import QThread, pyqtSignal
 from core.file_api import FileApi
+from core.folder_crawler import FolderCrawler
+from core.url_resolver import get_url_resolver
+from core.bulk_ops import is_systemic_error
+from concurrent.futures import ThreadPoolExecutor, wait
+from config.settings import RENAME_BATCH_SIZE, RENAME_BATCH_CONCURRENCY
 import os
+import threading
 
 class BatchRenameWorker(QThread):
     progress = pyqtSignal(int, int)  # 已完成，总数
     finished = pyqtSignal(int, int)  # 成功，失败
+    item_finished = pyqtSignal(object, bool, str)  # 文件ID，是否成功，错误信息
+    error = pyqtSignal(str)  # 与具体文件无关的批次错误（网络、限流、登录失效），只报告第一次
     
-    def __init__(self, api, token, rename_list, batch_size=3, parent=None):
+    def __init__(self, api, token, rename_list, batch_size=RENAME_BATCH_SIZE, parent=None):
         super().__init__(parent)
         self.api = api
         self.token = token
         self.rename_list = rename_list
-        self.batch_size = batch_size
+        self.batch_size = batch_size  # 每次批量重命名请求包含的文件数
+        self.results = {}  # 文件ID -> (是否成功, 错误信息)
         self._is_running = True
+        self._error_reported = False
+        self._lock = threading.Lock()
     
     def run(self):
-        import time
-        total = len(self.rename_list)
-        success, fail = 0, 0
-        for i in range(0, total, self.batch_size):
-            if not self._is_running:
-                break
-            batch = self.rename_list[i:i+self.batch_size]
+        # 跳过新文件名与原文件名相同的情况
+        items = [item for item in self.rename_list if item['old_name'] != item['new_name']]
+        self._total = len(self.rename_list)
+        self._done = self._total - len(items)
+        self._success, self._fail = 0, 0
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        # 批次并发提交，请求速率由接口层的限速器控制
+        with ThreadPoolExecutor(max_workers=RENAME_BATCH_CONCURRENCY) as executor:
+            list(executor.map(self.rename_batch, batches))
+        self.finished.emit(self._success, self._fail)
+    
+    def rename_batch(self, batch):
+        """
+        整批提交；错误与具体文件有关时逐个重命名该批次中的文件，
+        否则逐个重试也只会同样失败，整批记为失败并通过error信号报告
+        """
+        if not self._is_running:
+            return
+        try:
+            self.api.batch_rename_files(self.token, [f"{item['file_id']}|{item['new_name']}" for item in batch])
             for item in batch:
-                # 跳过新文件名与原文件名相同的情况
-                if item['old_name'] == item['new_name']:
-                    continue
-                try:
-                    self.api.rename_file(self.token, item['file_id'], item['new_name'])
-                    success += 1
-                except Exception as e:
-                    fail += 1
-                self.progress.emit(success+fail, total)
-            time.sleep(0.6)
-        self.finished.emit(success, fail)
+                self.report(item, True, '')
+            return
+        except Exception as e:
+            if is_systemic_error(e):
+                self.report_error(str(e))
+                for item in batch:
+                    self.report(item, False, str(e))
+                return
+        for item in batch:
+            if not self._is_running:
+                return
+            try:
+                self.api.rename_file(self.token, item['file_id'], item['new_name'])
+                self.report(item, True, '')
+            except Exception as e:
+                self.report(item, False, str(e))
+    
+    def report(self, item, ok, error):
+        with self._lock:
+            self.results[item['file_id']] = (ok, error)
+            self._done += 1
+            if ok:
+                self._success += 1
+            else:
+                self._fail += 1
+            done = self._done
+        self.item_finished.emit(item['file_id'], ok, error)
+        self.progress.emit(done, self._total)
+    
+    def report_error(self, error):
+        with self._lock:
+            if self._error_reported:
+                return
+            self._error_reported = True
+        self.error.emit(error)
     
     def stop(self):
         self._is_running = False
 
+class BulkOperationWorker(QThread):
+    finished = pyqtSignal(object)  # 每个ID的结果，ID -> None（成功）或错误信息
+    
+    def __init__(self, func, file_ids, parent=None):
+        super().__init__(parent)
+        self.func = func  # func(file_ids)，返回每个ID的结果
+        self.file_ids = file_ids
+    
+    def run(self):
+        try:
+            results = self.func(self.file_ids)
+        except Exception as e:
+            results = {file_id: str(e) for file_id in self.file_ids}
+        self.finished.emit(results)
+
 class AutoLoadWorker(QThread):
     progress = pyqtSignal(int)  # 已加载文件数量
-    finished = pyqtSignal(list)  # 完整的文件列表
+    finished = pyqtSignal(list)  # 完整的文件列表，被停止时不发出
     error = pyqtSignal(str)  # 错误信息
     
     def __init__(self, api, token, parent_id, page_size, parent=None):
@@ -53,28 +116,20 @@ class AutoLoadWorker(QThread):
     
     def run(self):
         all_files = []
-        last_file_id = None
         
-        while self._is_running:
-            try:
-                resp = self.api.get_file_list(self.token, parent_file_id=self.parent_id, limit=self.page_size, last_file_id=last_file_id)
-            except Exception as e:
-                self.error.emit(str(e))
-                return
-            
-            data = resp.get("data", {})
-            file_list = [f for f in data.get("fileList", []) if f.get('trashed', 0) == 0]
-            
-            if not file_list:
-                break
-                
-            all_files.extend(file_list)
-            self.progress.emit(len(all_files))
-            
-            if len(file_list) < self.page_size:
-                break
-                
-            last_file_id = file_list[-1].get('fileId')
+        try:
+            for file_info in self.api.iter_directory(self.token, self.parent_id, self.page_size):
+                if not self._is_running:
+                    # 被停止时列表不完整，不发出finished，避免被当作完整的目录写入缓存
+                    return
+                all_files.append(file_info)
+                # 每满一页报告一次进度
+                if len(all_files) % self.page_size == 0:
+                    self.progress.emit(len(all_files))
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        self.progress.emit(len(all_files))
         
         # 验证文件数据完整性
         valid_files = []
@@ -114,23 +169,17 @@ class FolderDownloadWorker(QThread):
                 self.error.emit("无法创建目标文件夹")
                 return
             
-            # 获取文件夹中的所有文件
-            all_files = self.get_all_files_in_folder()
-            if not all_files:
-                self.finished.emit(0, 0)
-                return
-            
-            # 为每个文件创建下载任务
-            success_count = 0
-            fail_count = 0
+            # 边遍历边并发获取下载地址，地址就绪的文件立即加入下载队列
+            lock = threading.Lock()
+            counts = {"success": 0, "fail": 0}
+            futures = []
+            resolver = get_url_resolver()
             
-            for i, file_info in enumerate(all_files):
+            def on_resolved(file_info, future):
                 if not self._is_running:
-                    break
-                
+                    return
                 try:
-                    # 获取下载链接
-                    url = self.api.get_download_url(self.token, file_info['fileId'])
+                    url = future.result()
                     
                     # 创建下载任务，使用原始文件名
                     task = self.download_manager.add_task(file_info['fileId'], file_info['filename'], url)
@@ -140,17 +189,37 @@ class FolderDownloadWorker(QThread):
                         task.save_path = target_folder
                         # 启动下载任务
                         self.download_manager.start_download(task)
-                        success_count += 1
+                        key = "success"
                     else:
-                        fail_count += 1
-                    
+                        key = "fail"
                 except Exception as e:
-                    fail_count += 1
+                    key = "fail"
                     print(f"创建下载任务失败 {file_info['filename']}: {e}")
                 
-                self.progress.emit(i + 1, len(all_files))
+                with lock:
+                    counts[key] += 1
+                    done = counts["success"] + counts["fail"]
+                    total = len(futures)
+                self.progress.emit(done, total)
+            
+            def on_file(file_info):
+                future = resolver.submit(self.token, file_info['fileId'])
+                with lock:
+                    futures.append(future)
+                future.add_done_callback(lambda f: on_resolved(file_info, f))
+            
+            def on_error(folder_id, e):
+                print(f"获取文件夹内容失败: {e}")
             
-            self.finished.emit(success_count, fail_count)
+            crawler = FolderCrawler(self.api, self.token)
+            crawler.crawl(self.folder_id, on_file, lambda: not self._is_running, on_error)
+            # 等待剩余的下载地址获取完成
+            for future in list(futures):
+                if not self._is_running:
+                    future.cancel()
+            wait(futures)
+            
+            self.finished.emit(counts["success"], counts["fail"])
             
         except Exception as e:
             self.error.emit(str(e))
@@ -172,34 +241,5 @@ class FolderDownloadWorker(QThread):
             print(f"创建文件夹失败: {e}")
             return None
     
-    def get_all_files_in_folder(self):
-        """递归获取文件夹中的所有文件"""
-        all_files = []
-        self._collect_files_recursive(self.folder_id, all_files)
-        return all_files
-    
-    def _collect_files_recursive(self, folder_id, file_list):
-        """递归收集文件"""
-        if not self._is_running:
-            return
-        
-        try:
-            resp = self.api.get_file_list(self.token, parent_file_id=folder_id, limit=100)
-            data = resp.get("data", {})
-            file_list_data = [f for f in data.get("fileList", []) if f.get('trashed', 0) == 0]
-            
-            for file_info in file_list_data:
-                if not self._is_running:
-                    return
-                
-                if file_info.get('type') == 0:  # 文件
-                    file_list.append(file_info)
-                elif file_info.get('type') == 1:  # 文件夹
-                    # 递归处理子文件夹
-                    self._collect_files_recursive(file_info['fileId'], file_list)
-                    
-        except Exception as e:
-            print(f"获取文件夹内容失败: {e}")
-    
     def stop(self):
         self._is_running = False 
\ No newline at end of file
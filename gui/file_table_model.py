@@ -0,0 +1,142 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from core.file_columns import FileColumns
+from array import array
+
+class FileTableModel(QAbstractTableModel):
+    """文件表格的数据模型：数据在列式存储里，只有可见的单元格才会被格式化；排序只调整行号到存储下标的映射"""
+
+    def __init__(self, format_size, headers, parent=None):
+        super().__init__(parent)
+        self.format_size = format_size
+        self.headers = list(headers)
+        self.store = FileColumns()
+        self.order = array('q')  # 行号 -> 存储下标
+        self._rows = None  # 存储下标 -> 行号，行的顺序变化后按需重建
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        i = self.order[index.row()]
+        col = index.column()
+        store = self.store
+        if role == Qt.DisplayRole:
+            if col == 0:  # 文件ID
+                return str(store.ids[i])
+            elif col == 1:  # 文件名
+                return store.names[i]
+            elif col == 2:  # 扩展名
+                return store.extension(i)
+            elif col == 3:  # 类型
+                return "文件夹" if store.types[i] == 1 else "文件"
+            elif col == 4:  # 大小
+                return self.format_size(store.sizes[i])
+            elif col == 5:  # 状态
+                return '正常' if store.statuses[i] < 100 else '审核驳回'
+            elif col == 6:  # 创建时间
+                return store.create_ats[i]
+        elif role == Qt.ToolTipRole and col == 1:
+            return store.names[i]  # 显示完整文件名
+        elif role == Qt.TextAlignmentRole and col not in (1, 6):
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section < len(self.headers):
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def set_header_text(self, section, text):
+        self.headers[section] = text
+        self.headerDataChanged.emit(Qt.Horizontal, section, section)
+
+    def set_files(self, files):
+        """整体替换表格数据"""
+        self.beginResetModel()
+        self.store.load(files)
+        self.order = array('q', range(len(self.store)))
+        self._rows = None
+        self.endResetModel()
+
+    def clear(self):
+        self.set_files([])
+
+    def file_at(self, row):
+        """行号对应的文件信息"""
+        if 0 <= row < len(self.order):
+            return self.store.records[self.order[row]]
+        return None
+
+    def file_by_id(self, file_id):
+        i = self.store.position(file_id)
+        return None if i is None else self.store.records[i]
+
+    def row_of(self, file_id):
+        """文件ID所在的行号，不在表格中返回-1"""
+        i = self.store.position(file_id)
+        if i is None:
+            return -1
+        if self._rows is None:
+            self._rows = array('q', bytes(8 * len(self.store)))
+            for row, j in enumerate(self.order):
+                self._rows[j] = row
+        return self._rows[i]
+
+    def sort_rows(self, levels, folders_first=True):
+        """
+        多列稳定排序：levels为[(列号, 是否降序), ...]，第一项为主排序列
+        从最次要的列开始依次做稳定排序，只改变行号映射，选中状态跟随原来的文件
+        """
+        self.layoutAboutToBeChanged.emit()
+        old_indexes = self.persistentIndexList()
+        old_items = [self.order[index.row()] for index in old_indexes]
+        order = list(range(len(self.store)))
+        for column, descending in reversed(levels):
+            order.sort(key=self.store.sort_keys(column).__getitem__, reverse=descending)
+        if folders_first:
+            order.sort(key=self.store.types.__getitem__, reverse=True)
+        self.order = array('q', order)
+        self._rows = None
+        if old_indexes:
+            self.changePersistentIndexList(
+                old_indexes, [self.index(self.row_of(self.store.ids[i]), index.column()) for i, index in zip(old_items, old_indexes)]
+            )
+        self.layoutChanged.emit()
+
+    def remove_rows(self, rows):
+        """删除若干行（连续的行合并为一次删除），返回被删除的文件信息"""
+        removed = []
+        rows = sorted(set(rows), reverse=True)
+        k = 0
+        while k < len(rows):
+            first = last = rows[k]
+            while k + 1 < len(rows) and rows[k + 1] == first - 1:
+                k += 1
+                first = rows[k]
+            self.beginRemoveRows(QModelIndex(), first, last)
+            removed.extend(self.store.records[i] for i in self.order[first:last + 1])
+            del self.order[first:last + 1]
+            self._rows = None
+            self.endRemoveRows()
+            k += 1
+        if removed:
+            # 按当前显示顺序重建存储，去掉已删除的条目
+            self.store.load([self.store.records[i] for i in self.order])
+            self.order = array('q', range(len(self.store)))
+        return removed[::-1]
+
+    def insert_file(self, row, file_info):
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.order.insert(row, self.store.append(file_info))
+        self._rows = None
+        self.endInsertRows()
+
+    def refresh_row(self, row):
+        """文件信息被修改后只重绘这一行"""
+        self.store.update(self.order[row])
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.headers) - 1))
@@ -128,12 +128,12 @@ QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
         parent_id = parent_id if parent_id is not None else self.current_parent_id
         self.table.setRowCount(0)
         self.table.setDisabled(True)
-        resp = self.api.get_file_list(self.token, parent_file_id=parent_id, limit=100)
-        if resp.get('code') != 0:
-            QMessageBox.warning(self, "错误", f"获取文件夹失败: {resp.get('message')}")
+        try:
+            folders = [f for f in self.api.iter_directory(self.token, parent_id) if f.get('type') == 1]
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"获取文件夹失败: {e}")
+            self.table.setDisabled(False)
             return
-        data = resp.get('data', {})
-        folders = [f for f in data.get('fileList', []) if f.get('type') == 1 and f.get('trashed', 0) == 0]
         self.table.setRowCount(len(folders))
         for row, f in enumerate(folders):
             self.table.setItem(row, 0, QTableWidgetItem(str(f.get('fileId'))))
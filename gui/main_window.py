@@ -6,104 +6,150 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from core.api import Pan123Api
+from core.progress_poller import ProgressPoller
+from core.rate_limiter import backoff_delay
+from config.settings import OFFLINE_SUBMIT_CONCURRENCY, OFFLINE_SUBMIT_MAX_RETRY
 from core.storage import TokenStorage
 from core.user import UserManager
 from gui.file_list_new import FileListPage
 from gui.recycle_bin import RecycleBinPage
 from gui.download_tasks import DownloadTaskWidget, DownloadTaskManager, OfflineTaskManager
 from gui.folder_select_dialog import FolderSelectDialog
-from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QIcon, QPixmap
 import base64
 import os
 import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
 from PyQt5.QtWidgets import QGraphicsDropShadowEffect
 from PyQt5.QtGui import QColor
 
 class ProgressQueryThread(QThread):
-    """异步查询离线任务进度的线程"""
-    progress_updated = pyqtSignal(list)  # 发送更新后的任务列表
+    """常驻的离线任务进度查询线程，刷新表格时只同步任务列表，不重新开始"""
+    progress_updated = pyqtSignal(list)  # 发送有变化的任务列表
     error_occurred = pyqtSignal(str)     # 发送错误信息
     round_completed = pyqtSignal(int)    # 发送轮次完成信号
     
     def __init__(self, tasks, token, api):
         super().__init__()
-        self.tasks = tasks
         self.token = token
-        self.api = api
+        self.poller = ProgressPoller(api)
+        self.poller.set_tasks(tasks)
         self.is_running = True
-        self.current_round = 1  # 当前轮次
-        self.max_tasks_per_batch = 3  # 每批最多查询3个任务
-        self.first_round_interval = 500  # 第一轮间隔0.5秒
-        self.subsequent_round_interval = 1000  # 后续轮次间隔1秒
+        self.current_round = 0  # 已完成的查询批次
+        self._wake = threading.Event()
+    
+    def update_tasks(self, tasks, token):
+        """同步任务列表：新任务立即查询，成功/失败的任务不再查询"""
+        self.token = token
+        self.poller.set_tasks(tasks)
+        self._wake.set()
     
     def run(self):
         try:
-            # 第一轮：查询所有任务
-            self.query_round(self.tasks, is_first_round=True)
-            self.round_completed.emit(self.current_round)
-            
-            # 后续轮次：只查询进行中的任务
             while self.is_running:
-                self.current_round += 1
-                self.msleep(self.subsequent_round_interval)
-                
-                if not self.is_running:
-                    break
-                
-                # 筛选进行中的任务
-                active_tasks = [task for task in self.tasks if task.status == "进行中"]
-                
-                if not active_tasks:
-                    # 没有进行中的任务，查询所有任务（可能有新任务或状态变化）
-                    active_tasks = [task for task in self.tasks if task.status not in ["成功", "失败"]]
-                
-                if not active_tasks:
-                    # 所有任务都完成了，停止查询
-                    break
-                
-                self.query_round(active_tasks, is_first_round=False)
-                self.round_completed.emit(self.current_round)
-                
+                # 每个任务按各自的退避间隔到期后才查询
+                changed = self.poller.poll_due(self.token)
+                if changed:
+                    self.current_round += 1
+                    self.progress_updated.emit(changed)
+                    self.round_completed.emit(self.current_round)
+                wait = self.poller.seconds_until_due()
+                # 最多等待1秒，及时响应停止和新任务
+                self._wake.wait(1 if wait is None else min(wait, 1))
+                self._wake.clear()
         except Exception as e:
             self.error_occurred.emit(str(e))
+        finally:
+            self.poller.close()
     
-    def query_round(self, tasks_to_query, is_first_round=False):
-        """查询一轮任务进度"""
-        interval = self.first_round_interval if is_first_round else 100  # 第一轮间隔0.5秒，后续轮次间隔0.1秒
-        
-        for i in range(0, len(tasks_to_query), self.max_tasks_per_batch):
-            if not self.is_running:
+    def stop(self):
+        self.is_running = False
+        self._wake.set()
+
+class OfflineSubmitThread(QThread):
+    """在后台并发推送离线下载链接，每完成一个就通知界面并写入离线任务列表"""
+    item_finished = pyqtSignal(int, int, str)  # 已完成数，总数，结果信息
+    all_finished = pyqtSignal(int, int)        # 成功，失败
+    
+    def __init__(self, urls, token, dir_id, api, task_manager):
+        super().__init__()
+        self.urls = urls
+        self.token = token
+        self.dir_id = dir_id
+        self.api = api
+        self.task_manager = task_manager
+        self.is_running = True
+        self._lock = threading.Lock()
+        self._done = 0
+        self._success = 0
+    
+    def run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=OFFLINE_SUBMIT_CONCURRENCY) as executor:
+                list(executor.map(self.submit_one, self.urls))
+        finally:
+            self.all_finished.emit(self._success, self._done - self._success)
+    
+    @staticmethod
+    def is_retryable(error):
+        """
+        服务端明确返回暂时错误，或连接尚未建立（请求没有发出）时才重试；
+        请求发出后超时或断开时服务端可能已经创建了任务，提交接口不是幂等的，不重试以免重复创建
+        """
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if isinstance(error, requests.ConnectionError):
+            return any(k in str(error) for k in ('NewConnectionError', 'Failed to establish', 'NameResolution'))
+        if isinstance(error, requests.RequestException):
+            return False
+        return any(k in str(error) for k in ('稍后', '服务内部错误'))
+    
+    def submit_one(self, url):
+        """提交一个链接，无论出现什么异常都会报告结果"""
+        if not self.is_running:
+            return
+        try:
+            success, msg = self.submit(url)
+        except Exception as e:
+            success, msg = False, f"❌ 保存任务失败: {e}"
+        self.report(success, msg)
+    
+    def submit(self, url):
+        for attempt in range(OFFLINE_SUBMIT_MAX_RETRY):
+            try:
+                task_id = self.api.send_offline_download_request(self.token, url, dir_id=self.dir_id)
                 break
-            
-            # 获取当前批次的任务
-            batch_tasks = tasks_to_query[i:i + self.max_tasks_per_batch]
-            
-            # 查询当前批次
-            for task in batch_tasks:
-                if not self.is_running:
-                    break
-                
-                if self.token and task.task_id:
-                    try:
-                        resp = self.api.check_download_progress(self.token, task.task_id)
-                        if resp.get('code') == 0 and 'data' in resp:
-                            progress = int(resp['data'].get('process', 0))
-                            st = resp['data'].get('status', 0)
-                            status = {0: "进行中", 1: "失败", 2: "成功", 3: "重试中"}.get(st, str(st))
-                            
-                            # 更新任务状态
-                            task.progress = progress
-                            task.status = status
-                    except Exception as e:
-                        task.status = "查询失败"
-            
-            # 发送当前批次更新
-            self.progress_updated.emit(self.tasks.copy())
-            
-            # 批次间延迟
-            if i + self.max_tasks_per_batch < len(tasks_to_query):
-                self.msleep(interval)
+            except Exception as e:
+                err_msg = str(e)
+                if attempt + 1 >= OFFLINE_SUBMIT_MAX_RETRY or not self.is_running or not self.is_retryable(e):
+                    if '解析失败' in err_msg:
+                        msg = f"❌ 链接解析失败"
+                    elif '服务内部错误' in err_msg:
+                        msg = f"❌ 服务器内部错误"
+                    else:
+                        msg = f"❌ 下载失败"
+                    return False, msg
+                time.sleep(backoff_delay(attempt))
+        # 获取文件名（如API无返回则用URL最后一段或占位）
+        file_name = ''
+        # 尝试从url获取文件名
+        if '/' in url:
+            file_name = url.rstrip('/').split('/')[-1]
+        if not file_name:
+            file_name = '未知文件'
+        self.task_manager.add_task(task_id, file_name, url)
+        return True, f"✅ 成功: {url}"
+    
+    def report(self, success, msg):
+        with self._lock:
+            self._done += 1
+            if success:
+                self._success += 1
+            done = self._done
+        self.item_finished.emit(done, len(self.urls), msg)
     
     def stop(self):
         self.is_running = False
@@ -465,6 +511,7 @@ class MainWindow(QMainWindow):
         self.user_manager = UserManager()
         self.current_user = None
         self.download_task_manager = DownloadTaskManager()
+        self.download_task_manager.url_resolver = self.resolve_download_url
         self.offline_task_manager = OfflineTaskManager()
         self.progress_query_thread = None  # 进度查询线程
         self.init_ui()
@@ -808,10 +855,23 @@ QWidget {
                 self.clear_btn.setFixedSize(44, 16)
                 self.clear_btn.setStyleSheet('QPushButton{background:qlineargradient(x1:0,y1:0,x2:1,y2:0,stop:0 #FF7875,stop:1 #FF4D4F);color:#fff;border:none;border-radius:8px;font-size:13px;} QPushButton:hover{background:#FF4D4F;}')
                 self.clear_btn.clicked.connect(self.clear_all_tasks)
+                # 暂停/继续按钮
+                self.pause_btn = QPushButton("暂停")
+                self.pause_btn.setFixedSize(44, 16)
+                self.pause_btn.setStyleSheet('QPushButton{background:qlineargradient(x1:0,y1:0,x2:1,y2:0,stop:0 #FAAD14,stop:1 #FFC53D);color:#fff;border:none;border-radius:8px;font-size:13px;} QPushButton:hover{background:#FAAD14;}')
+                self.pause_btn.clicked.connect(self.pause_selected_tasks)
+                self.resume_btn = QPushButton("继续")
+                self.resume_btn.setFixedSize(44, 16)
+                self.resume_btn.setStyleSheet('QPushButton{background:qlineargradient(x1:0,y1:0,x2:1,y2:0,stop:0 #165DFF,stop:1 #0FC6C2);color:#fff;border:none;border-radius:8px;font-size:13px;} QPushButton:hover{background:#165DFF;}')
+                self.resume_btn.clicked.connect(self.resume_selected_tasks)
                 btn_layout = QHBoxLayout()
                 btn_layout.addWidget(self.delete_btn)
                 btn_layout.addSpacing(16)
                 btn_layout.addWidget(self.clear_btn)
+                btn_layout.addSpacing(16)
+                btn_layout.addWidget(self.pause_btn)
+                btn_layout.addSpacing(16)
+                btn_layout.addWidget(self.resume_btn)
                 btn_layout.addStretch()
                 btn_layout.setContentsMargins(8, 12, 8, 18)  # 上下左右留白，按钮不贴表格
                 wrapper_layout.addLayout(btn_layout)
@@ -824,7 +884,7 @@ QWidget {
                 from PyQt5.QtWidgets import QMessageBox
                 reply = QMessageBox.question(self, "确认清空", "确定要清空所有上传任务吗？", QMessageBox.Yes | QMessageBox.No)
                 if reply == QMessageBox.Yes:
-                    self.manager.tasks.clear()
+                    self.manager.clear_tasks()
                     self.refresh_table()
             def refresh_table(self):
                 tasks = self.manager.tasks
@@ -901,11 +961,7 @@ QProgressBar::chunk {
                 QTimer.singleShot(0, self.refresh_table)
             def update_status(self, task):
                 QTimer.singleShot(0, self.refresh_table)
-            def auto_start_uploads(self):
-                # 只在有待上传任务时校验token
-                has_pending = any(task.status == '待上传' for task in self.manager.tasks)
-                if not has_pending:
-                    return
+            def get_token(self):
                 main_win = self.parent()
                 while main_win and not hasattr(main_win, 'get_token_func'):
                     main_win = main_win.parent()
@@ -913,23 +969,48 @@ QProgressBar::chunk {
                 if not token:
                     from PyQt5.QtWidgets import QMessageBox
                     QMessageBox.warning(self, "提示", "请先登录/选择用户并获取有效Token！")
+                return token
+            def auto_start_uploads(self):
+                # 只在有待上传任务时校验token
+                has_pending = any(task.status == '待上传' for task in self.manager.tasks)
+                if not has_pending:
+                    return
+                token = self.get_token()
+                if not token:
                     return
                 for task in self.manager.tasks:
                     if task.status == '待上传':
                         self.manager.start_upload(task, token, self.update_progress, self.update_status)
+            def selected_tasks(self):
+                rows = sorted(set([i.row() for i in self.table.selectedIndexes()]))
+                return [self.manager.tasks[row] for row in rows if 0 <= row < len(self.manager.tasks)]
+            def pause_selected_tasks(self):
+                for task in self.selected_tasks():
+                    self.manager.pause_upload(task)
+                self.refresh_table()
+            def resume_selected_tasks(self):
+                tasks = [t for t in self.selected_tasks() if t.status in ('已暂停', '失败', '已取消')]
+                if not tasks:
+                    return
+                token = self.get_token()
+                if not token:
+                    return
+                for task in tasks:
+                    self.manager.resume_upload(task, token, self.update_progress, self.update_status)
             def delete_task(self, row):
                 if 0 <= row < len(self.manager.tasks):
                     task = self.manager.tasks[row]
-                    # 若正在上传可加终止逻辑
+                    self.manager.cancel_upload(task)
                     self.manager.tasks.pop(row)
                     self.refresh_table()
             def delete_selected_task(self):
                 selected_rows = sorted(set([i.row() for i in self.table.selectedIndexes()]), reverse=True)
                 for row in selected_rows:
                     if 0 <= row < len(self.manager.tasks):
+                        self.manager.cancel_upload(self.manager.tasks[row])
                         self.manager.tasks.pop(row)
                 self.refresh_table()
-        self.upload_manager = UploadManager()
+        self.upload_manager = UploadManager(self.current_user)
         self.upload_task_widget = UploadTaskWidget(self.upload_manager, self)
         self.stack.addWidget(self.upload_task_widget)
 
@@ -1076,12 +1157,12 @@ QProgressBar::chunk {
         if not token:
             return
             
-        # 停止之前的查询线程
+        # 查询线程已在运行时只同步任务列表，保留各任务的查询节奏
         if self.progress_query_thread and self.progress_query_thread.isRunning():
-            self.progress_query_thread.stop()
-            self.progress_query_thread.wait()
+            self.progress_query_thread.update_tasks(tasks, token)
+            return
         
-        # 创建新的查询线程，传递任务的副本
+        # 创建查询线程，传递任务的副本
         tasks_copy = tasks.copy()
         self.progress_query_thread = ProgressQueryThread(tasks_copy, token, self.api)
         self.progress_query_thread.progress_updated.connect(self.on_progress_updated)
@@ -1095,13 +1176,14 @@ QProgressBar::chunk {
     def on_progress_updated(self, updated_tasks):
         """进度查询线程返回更新结果"""
         try:
-            # 更新原始任务列表
-            original_tasks = self.offline_task_manager.get_tasks()
-            for i, updated_task in enumerate(updated_tasks):
-                if i < len(original_tasks):
+            # 按task_id定位原始任务和所在行
+            for updated_task in updated_tasks:
+                i = self.offline_task_manager.get_row(updated_task.task_id)
+                if i is not None:
                     # 更新原始任务对象
-                    original_tasks[i].progress = updated_task.progress
-                    original_tasks[i].status = updated_task.status
+                    original_task = self.offline_task_manager.get_task(updated_task.task_id)
+                    original_task.progress = updated_task.progress
+                    original_task.status = updated_task.status
                                         
                     # 更新界面显示
                     if i < self.progress_table.rowCount():
@@ -1197,39 +1279,20 @@ QProgressBar::chunk {
         dlg = PushProgressDialog(len(urls), self)
         self.submit_btn.setEnabled(False)
         dlg.show()
-        QApplication.processEvents()
-        success_count = 0
-        fail_count = 0
-        new_tasks = []
-        for idx, url in enumerate(urls, 1):
-            QApplication.processEvents()
-            if dlg.is_aborted():
-                break
-            try:
-                dir_id_val = dir_id if dir_id and dir_id != '0' else None
-                task_id = api.send_offline_download_request(token, url, dir_id=dir_id_val)
-                success_count += 1
-                # 获取文件名（如API无返回则用URL最后一段或占位）
-                file_name = ''
-                # 尝试从url获取文件名
-                if '/' in url:
-                    file_name = url.rstrip('/').split('/')[-1]
-                if not file_name:
-                    file_name = '未知文件'
-                self.offline_task_manager.add_task(task_id, file_name, url)
-                dlg.update_progress(idx, len(urls), f"✅ 成功: {url}")
-            except Exception as e:
-                err_msg = str(e)
-                if '解析失败' in err_msg:
-                    dlg.update_progress(idx, len(urls), f"❌ 链接解析失败")
-                elif '服务内部错误' in err_msg:
-                    dlg.update_progress(idx, len(urls), f"❌ 服务器内部错误")
-                else:
-                    dlg.update_progress(idx, len(urls), f"❌ 下载失败")
-                fail_count += 1
-        # 离线任务直接写入download_manager，无需再维护self.task_list
-        dlg.finish()
-        self.submit_btn.setEnabled(True)
+        dir_id_val = dir_id if dir_id and dir_id != '0' else None
+        # 推送在后台线程中并发进行，结果逐条回到对话框
+        self.offline_submit_thread = OfflineSubmitThread(urls, token, dir_id_val, api, self.offline_task_manager)
+        self.offline_submit_thread.item_finished.connect(dlg.update_progress)
+        dlg.abort_btn.clicked.connect(self.offline_submit_thread.stop)
+        
+        def on_all_finished(success_count, fail_count):
+            # 离线任务直接写入download_manager，无需再维护self.task_list
+            if not dlg.is_aborted():
+                dlg.finish()
+            self.submit_btn.setEnabled(True)
+        
+        self.offline_submit_thread.all_finished.connect(on_all_finished)
+        self.offline_submit_thread.start()
 
     def add_user_dialog(self):
         dlg = UserDialog(self)
@@ -1327,6 +1390,10 @@ QProgressBar::chunk {
         self.current_user = name
         self.offline_task_manager.set_user(name)
         self.download_task_manager.set_user(name)
+        if hasattr(self, 'upload_manager'):
+            self.upload_manager.set_user(name)
+        if hasattr(self, 'recycle_bin_page'):
+            self.recycle_bin_page.set_user(name)
         
         # 更新按钮状态
         self.login_btn.setEnabled(False)
@@ -1335,8 +1402,9 @@ QProgressBar::chunk {
         # 更新用户列表样式（登录状态）
         self.update_user_table_logged_in_style()
         
-        # 重置文件列表页面的当前目录ID
+        # 重置文件列表页面的当前目录ID，并切换到该用户的本地目录镜像
         if hasattr(self, 'file_list_page'):
+            self.file_list_page.set_user(name)
             self.file_list_page.current_parent_id = '0'
         
         QMessageBox.information(self, "成功", f"已确认使用用户 {name}")
@@ -1394,6 +1462,10 @@ QProgressBar::chunk {
         self.current_user = name
         self.offline_task_manager.set_user(name)
         self.download_task_manager.set_user(name)
+        if hasattr(self, 'upload_manager'):
+            self.upload_manager.set_user(name)
+        if hasattr(self, 'recycle_bin_page'):
+            self.recycle_bin_page.set_user(name)
         
         # 更新按钮状态
         self.login_btn.setEnabled(False)
@@ -1402,8 +1474,9 @@ QProgressBar::chunk {
         # 更新用户列表样式（登录状态）
         self.update_user_table_logged_in_style()
         
-        # 重置文件列表页面的当前目录ID
+        # 重置文件列表页面的当前目录ID，并切换到该用户的本地目录镜像
         if hasattr(self, 'file_list_page'):
+            self.file_list_page.set_user(name)
             self.file_list_page.current_parent_id = '0'
         
         # 只在首次设置记忆登录时显示提示
@@ -1438,20 +1511,21 @@ QProgressBar::chunk {
         
         # 清除文件列表
         if hasattr(self, 'file_list_page'):
-            self.file_list_page.clear_cache()
+            self.file_list_page.set_user(None)
             self.file_list_page.clear_file_list()
         
         # 清除回收站数据
         if hasattr(self, 'recycle_bin_page'):
             self.recycle_bin_page.clear_data()
+            self.recycle_bin_page.set_user(None)
         
         # 清除下载任务数据
         if hasattr(self, 'download_task_manager'):
             self.download_task_manager.clear_tasks()
         
-        # 清除上传任务数据
+        # 移出上传任务，断点记录保留，重新登录后恢复为已暂停的任务
         if hasattr(self, 'upload_manager'):
-            self.upload_manager.clear_tasks()
+            self.upload_manager.set_user(None)
         
         QMessageBox.information(self, "成功", "已退出登录状态")
 
@@ -1645,6 +1719,9 @@ QProgressBar::chunk {
         # 停止定时器
         self.stop_progress_timer()
         
+        # 保存尚未写盘的下载进度
+        self.download_task_manager.flush()
+        
         super().closeEvent(event)
 
     def check_auto_login(self):
@@ -1702,6 +1779,10 @@ QProgressBar::chunk {
         self.current_user = name
         self.offline_task_manager.set_user(name)
         self.download_task_manager.set_user(name)
+        if hasattr(self, 'upload_manager'):
+            self.upload_manager.set_user(name)
+        if hasattr(self, 'recycle_bin_page'):
+            self.recycle_bin_page.set_user(name)
         
         # 更新按钮状态
         self.login_btn.setEnabled(False)
@@ -1710,14 +1791,20 @@ QProgressBar::chunk {
         # 更新用户列表样式（登录状态）
         self.update_user_table_logged_in_style()
         
-        # 重置文件列表页面的当前目录ID
+        # 重置文件列表页面的当前目录ID，并切换到该用户的本地目录镜像
         if hasattr(self, 'file_list_page'):
+            self.file_list_page.set_user(name)
             self.file_list_page.current_parent_id = '0'
         
         # 切换用户后，更新下载路径显示
         if hasattr(self, 'download_task_widget'):
             self.download_task_widget.path_label.setText(f"下载路径: {self.download_task_manager.get_download_path() or '未设置'}")
     
+    def resolve_download_url(self, file_id):
+        """重新获取文件的下载地址（签名地址过期时使用）"""
+        from core.url_resolver import get_url_resolver
+        return get_url_resolver().resolve(self.get_token_func(), file_id, refresh=True)
+
     def get_token_func(self):
         if self.current_user:
             user = self.user_manager.get_user(self.current_user)
@@ -2,6 +2,9 @@ from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTa
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt5.QtGui import QIcon
 from core.file_api import FileApi
+from core.bulk_ops import failed_ids, succeeded_ids, summarize
+from core.metadata_store import MetadataStore
+from gui.file_list_workers import BulkOperationWorker
 import os
 
 class RecycleBinWorker(QThread):
@@ -70,6 +73,7 @@ class RecycleBinPage(QWidget):
         super().__init__(parent)
         self.get_token_func = get_token_func
         self.api = FileApi()
+        self.metadata = None  # 当前用户的本地目录镜像，由set_user创建
         self.file_list = []
         self.page_size = 100
         self.total = 0
@@ -81,6 +85,10 @@ class RecycleBinPage(QWidget):
         self.info_hide_timer.timeout.connect(self.hide_info_label)
         self.init_ui()
     
+    def set_user(self, username):
+        """切换用户：恢复文件后作废该用户本地目录镜像中的原目录"""
+        self.metadata = MetadataStore(username) if username else None
+    
     def init_ui(self):
         layout = QVBoxLayout(self)
         layout.setContentsMargins(8, 8, 8, 8)
@@ -507,21 +515,9 @@ class RecycleBinPage(QWidget):
             QMessageBox.warning(self, "错误", "请先选择用户")
             return
         
-        try:
-            # 分批处理，每批最多100个
-            batch_size = 100
-            for i in range(0, len(file_ids), batch_size):
-                batch = file_ids[i:i + batch_size]
-                self.api.recover_file(token, batch)
-            
-            QMessageBox.information(self, "成功", f"已成功恢复{len(file_ids)}个文件")
-            self.load_recycle_bin()  # 重新加载列表
-        except Exception as e:
-            # 简化错误信息
-            error_msg = str(e)
-            if len(error_msg) > 100:
-                error_msg = error_msg[:100] + "..."
-            QMessageBox.critical(self, "错误", f"恢复文件失败：{error_msg}")
+        # 后台分块并发处理，返回每个文件的结果
+        self.run_bulk("恢复", lambda ids: self.api.bulk_recover_files(token, ids), file_ids, f"已成功恢复{len(file_ids)}个文件",
+                      self.apply_recovered)
     
     def delete_files(self, file_ids):
         """永久删除文件"""
@@ -530,21 +526,34 @@ class RecycleBinPage(QWidget):
             QMessageBox.warning(self, "错误", "请先选择用户")
             return
         
-        try:
-            # 分批处理，每批最多100个
-            batch_size = 100
-            for i in range(0, len(file_ids), batch_size):
-                batch = file_ids[i:i + batch_size]
-                self.api.delete_file_permanently(token, batch)
-            
-            QMessageBox.information(self, "成功", f"已成功删除{len(file_ids)}个文件")
-            self.load_recycle_bin()  # 重新加载列表
-        except Exception as e:
-            # 简化错误信息
-            error_msg = str(e)
-            if len(error_msg) > 100:
-                error_msg = error_msg[:100] + "..."
-            QMessageBox.critical(self, "错误", f"删除文件失败：{error_msg}")
+        # 后台分块并发处理，返回每个文件的结果
+        self.run_bulk("删除", lambda ids: self.api.bulk_delete_permanently(token, ids), file_ids, f"已成功删除{len(file_ids)}个文件")
+    
+    def run_bulk(self, action, func, file_ids, success_text, apply=None):
+        """在后台线程执行批量操作func(file_ids)，完成后对成功的ID调用apply并显示结果"""
+        self.info_label.setText(f"正在{action}{len(file_ids)}个文件...")
+        self.info_label.setVisible(True)
+        self.bulk_worker = BulkOperationWorker(func, file_ids, self)
+        self.bulk_worker.finished.connect(lambda results: self.show_bulk_result(action, results, success_text, apply))
+        self.bulk_worker.start()
+    
+    def apply_recovered(self, file_ids):
+        """文件恢复后作废原目录的本地目录镜像，文件列表页下次打开这些目录时重新列举"""
+        if not self.metadata:
+            return
+        ids = {str(i) for i in file_ids}
+        for parent_id in {f.get('parentFileId', 0) for f in self.file_list if str(f.get('fileId')) in ids}:
+            self.metadata.invalidate(parent_id)
+    
+    def show_bulk_result(self, action, results, success_text, apply=None):
+        """显示批量操作结果，有失败时列出成功和失败数量，然后重新加载列表"""
+        if apply:
+            apply(succeeded_ids(results))
+        if failed_ids(results):
+            QMessageBox.warning(self, "部分失败", summarize(action, results))
+        else:
+            QMessageBox.information(self, "成功", success_text)
+        self.load_recycle_bin()  # 重新加载列表
     
     def closeEvent(self, event):
         """关闭事件"""
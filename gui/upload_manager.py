@@ -1,7 +1,21 @@
 # 上传任务管理器
 from core.upload_api import UploadApi
+from core.hash_cache import HashCache
+from core.upload_journal import UploadJournal
+from core.metadata_store import MetadataStore
+from core.utils import calc_bytes_md5, calc_file_and_slice_md5, iter_file_slices, count_slices
+from core.rate_limiter import backoff_delay
+from config.settings import (
+    UPLOAD_SLICE_CONCURRENCY, UPLOAD_SLICE_MAX_RETRY, UPLOAD_RETRY_BACKOFF, UPLOAD_DEFAULT_SLICE_SIZE,
+    UPLOAD_MAX_ACTIVE_TASKS, UPLOAD_HASH_CONCURRENCY, UPLOAD_NETWORK_CONCURRENCY, UPLOAD_SCHEDULE_POLICY,
+    UPLOAD_VERIFY_POLL_MAX_DELAY
+)
+from concurrent.futures import ThreadPoolExecutor
 import threading
+import heapq
+import sqlite3
 import time
+import os
 
 class UploadTask:
     def __init__(self, file_path, parent_id=0):
@@ -11,149 +25,385 @@ class UploadTask:
         self.file_size = 0
         self.file_md5 = None
         self.slice_size = 0
-        self.slices = []  # [(index, data, md5)]
+        self.slice_md5s = []  # 预先算好的分片MD5，按分片序号排列
+        self.hash_slice_size = 0  # 计算slice_md5s时使用的分片大小
         self.preupload_id = None
         self.servers = []
+        self.done_slices = set()  # 服务端已确认的分片序号
+        self.journal_key = None  # 断点记录的键
+        self.journal = None  # 所属用户的断点记录，切换用户后仍写回原来的记录
+        self.metadata = None  # 所属用户的本地目录镜像，上传完成后作废目标文件夹
         self.progress = 0  # 0-100
-        self.status = '待上传'  # 待上传/上传中/已完成/失败
+        self.status = '待上传'  # 待上传/排队中/上传中/已暂停/已取消/已完成/失败
         self.completed = False
         self.file_id = None
         self.error = ''
         self.thread = None
+        self.running = False  # 是否正在某个工作线程中执行
+        self._queue_seq = 0  # 最近一次入队的序号，用于识别过期的队列条目
+        self._stop_reason = None  # 'pause'/'cancel'，由上传线程在分片间检查
 
 class UploadManager:
-    def __init__(self):
+    def __init__(self, username=None):
         self.api = UploadApi()
+        self.hash_cache = HashCache()
+        self.journal = UploadJournal(username)
+        self.metadata = MetadataStore(username) if username else None
         self.tasks = []
+        # 调度：优先队列 + 固定数量的工作线程
+        self._queue = []
+        self._queue_seq = 0
+        self._cond = threading.Condition()
+        self._workers = []
+        # 全局并发上限：同时计算哈希的任务数、同时在途的分片请求数
+        self.hash_slots = threading.Semaphore(UPLOAD_HASH_CONCURRENCY)
+        self.net_slots = threading.Semaphore(UPLOAD_NETWORK_CONCURRENCY)
+        self.restore_tasks()
 
     def add_task(self, file_path, parent_id=0):
         task = UploadTask(file_path, parent_id)
+        task.journal = self.journal
+        task.metadata = self.metadata
         self.tasks.append(task)
         return task
 
+    def set_user(self, username):
+        """
+        切换用户：改用该用户的断点记录并恢复其未完成的上传。
+        上一个用户未在执行的任务从列表中移除（断点记录保留，切换回来时恢复），
+        正在执行的任务继续使用原来的令牌和断点记录
+        """
+        self.journal.flush()
+        with self._cond:
+            for task in self.tasks:
+                if not task.running and task.status == '排队中':
+                    task.status = '已暂停'
+            self.tasks = [task for task in self.tasks if task.running]
+        self.journal = UploadJournal(username)
+        self.metadata = MetadataStore(username) if username else None
+        self.restore_tasks()
+
+    def restore_tasks(self):
+        """把上次未完成的分片上传恢复为已暂停的任务"""
+        for entry in self.journal.entries():
+            if not os.path.exists(entry["file_path"]) or os.path.getsize(entry["file_path"]) != entry["file_size"]:
+                self.journal.remove(entry["key"])
+                continue
+            task = self.add_task(entry["file_path"], entry["parent_id"])
+            task.file_name = os.path.basename(entry["file_path"])
+            task.file_size = entry["file_size"]
+            task.journal_key = entry["key"]
+            total = count_slices(entry["file_size"], entry["slice_size"])
+            task.progress = round(5 + len(entry["done_slices"]) / total * 95, 1)
+            task.status = '已暂停'
+
     def start_upload(self, task, token, progress_callback=None, status_callback=None):
-        """启动单个上传任务，支持进度和状态回调"""
-        def run():
-            import os
+        """把上传任务放入调度队列，由固定数量的工作线程依次执行，支持进度和状态回调"""
+        with self._cond:
+            task._stop_reason = None
+            task.status = '排队中'
+            task.error = ''
+            self._queue_seq += 1
+            task._queue_seq = self._queue_seq
+            priority = self._task_priority(task)
+            heapq.heappush(self._queue, (priority, self._queue_seq, task, token, progress_callback, status_callback))
+            self._ensure_workers()
+            self._cond.notify()
+        if status_callback:
+            status_callback(task)
+
+    @staticmethod
+    def _task_priority(task):
+        """小文件优先时以文件大小为优先级，否则按入队顺序"""
+        if UPLOAD_SCHEDULE_POLICY != 'small_first':
+            return 0
+        try:
+            return os.path.getsize(task.file_path)
+        except OSError:
+            return 0
+
+    def _ensure_workers(self):
+        """按需启动上传工作线程，线程数固定为UPLOAD_MAX_ACTIVE_TASKS"""
+        while len(self._workers) < UPLOAD_MAX_ACTIVE_TASKS:
+            worker = threading.Thread(target=self._worker_loop, daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, seq, task, token, progress_callback, status_callback = heapq.heappop(self._queue)
+                # 排队期间被暂停、取消或重新入队的旧条目直接丢弃
+                if seq != task._queue_seq or task.status != '排队中':
+                    continue
+                task.running = True
+                task.thread = threading.current_thread()
             try:
-                task.status = '校验中...'
+                self.run_task(task, token, progress_callback, status_callback)
+            finally:
+                task.running = False
+                task.thread = None
+
+    def run_task(self, task, token, progress_callback=None, status_callback=None):
+        """在工作线程中执行单个上传任务"""
+        try:
+            task.status = '校验中...'
+            task.error = ''
+            task.progress = 0
+            if status_callback:
+                status_callback(task)
+            if progress_callback:
+                progress_callback(task)
+            # 1. 计算MD5，优先命中本地哈希缓存；否则一次读盘同时得到文件MD5和分片MD5
+            task.file_name = os.path.basename(task.file_path)
+            task.file_size = os.path.getsize(task.file_path)
+            # 限制同时读盘计算哈希的任务数
+            with self.hash_slots:
+                self.load_file_hashes(task)
+            # 校验完成，进度设为5%
+            task.progress = 5
+            if status_callback:
+                status_callback(task)
+            if progress_callback:
+                progress_callback(task)
+            # 2. 有断点记录时直接续传，否则创建文件
+            task.journal_key = task.journal.make_key(task.file_path, task.file_md5, task.parent_id)
+            resumed = self.restore_from_journal(task)
+            error = None if resumed else self.create_upload(task, token)
+            # 校验通过，进入上传中
+            if not error and not task.completed:
+                task.status = '上传中...'
                 task.error = ''
-                task.progress = 0
                 if status_callback:
                     status_callback(task)
-                if progress_callback:
-                    progress_callback(task)
-                # 1. 计算MD5
-                from core.utils import calc_file_md5, split_file, calc_bytes_md5
-                task.file_name = os.path.basename(task.file_path)
-                task.file_size = os.path.getsize(task.file_path)
-                task.file_md5 = calc_file_md5(task.file_path)
-                # 校验完成，进度设为5%
-                task.progress = 5
+                # 3. 多分片并发上传，只读取缺失的分片
+                error = self.upload_slices(task, token, progress_callback)
+                if error and resumed and not task._stop_reason:
+                    # 断点记录可能已失效（预上传ID过期），放弃记录重新上传
+                    task.journal.remove(task.journal_key)
+                    error = self.create_upload(task, token)
+                    if not error and not task.completed:
+                        error = self.upload_slices(task, token, progress_callback)
+            if task._stop_reason:
+                self.finish_stopped(task)
+                if status_callback:
+                    status_callback(task)
+                return
+            if error:
+                task.status = '失败'
+                task.error = error
                 if status_callback:
                     status_callback(task)
+                return
+            if task.completed:
+                # 秒传
+                task.status = '已完成'
+                task.progress = 100
+                self.record_uploaded(task)
                 if progress_callback:
                     progress_callback(task)
-                # 2. 创建文件
-                resp = self.api.create_file(token, task.file_name, task.file_size, task.file_md5, parent_file_id=task.parent_id)
-                if resp["code"] != 0:
-                    task.status = '失败'
-                    task.error = resp.get('message', '创建文件失败')
-                    if status_callback:
-                        status_callback(task)
-                    return
-                data = resp["data"]
-                if data.get("reuse"):
-                    task.status = '已完成'
-                    task.progress = 100
-                    task.completed = True
-                    if progress_callback:
-                        progress_callback(task)
-                    if status_callback:
-                        status_callback(task)
-                    return
-                task.slice_size = data["sliceSize"]
-                task.preupload_id = data["preuploadID"]
-                task.servers = data["servers"]
-                # 校验通过，进入上传中
-                task.status = '上传中...'
-                task.error = ''
                 if status_callback:
                     status_callback(task)
-                # 3. 分片切割
-                slices = split_file(task.file_path, task.slice_size)
-                total = len(slices)
-                # 4. 逐片上传
-                last_reported = 5
-                for idx, chunk in slices:
-                    slice_md5 = calc_bytes_md5(chunk)
-                    upload_resp = self.api.upload_slice(token, task.preupload_id, idx, chunk, slice_md5, task.servers[0])
-                    if upload_resp["code"] != 0:
-                        task.status = '失败'
-                        task.error = upload_resp.get('message', '分片上传失败')
-                        if status_callback:
-                            status_callback(task)
-                        return
-                    # 进度从5%~100%
-                    progress = 5 + (idx + 1) / total * 95
-                    if int(progress) // 5 > last_reported // 5 or progress >= 100:
-                        task.progress = round(progress, 1)
-                        last_reported = int(progress)
-                        if progress_callback:
-                            progress_callback(task)
-                # 5. 上传完毕，轮询直到completed为true
-                max_retry = 60
-                retry = 0
-                fake_progress = 90
-                while retry < max_retry:
-                    complete_resp = self.api.complete_upload(token, task.preupload_id)
-                    try:
-                        completed = False
-                        file_id = None
-                        if isinstance(complete_resp, dict):
-                            data = complete_resp.get("data", {})
-                            completed = data.get("completed") is True
-                            file_id = data.get("fileID", 0)
-                        if completed:
-                            task.status = '已完成'
-                            task.progress = 100
-                            task.completed = True
-                            task.file_id = file_id
-                            task.error = ''
-                            break
-                        elif not completed:
-                            task.status = '校验中...'
-                            task.error = '文件正在校验中, 请间隔1秒后再试'
-                            # 校验中进度条递增到99%
-                            if fake_progress < 99:
-                                fake_progress += 1
-                            task.progress = fake_progress
-                            if status_callback:
-                                status_callback(task)
-                            time.sleep(1)
-                            retry += 1
-                            continue
-                        else:
-                            task.status = '失败'
-                            task.error = complete_resp.get('message', '上传完毕未完成')
-                            break
-                    except Exception as e:
+                return
+            # 4. 上传完毕，轮询直到completed为true
+            max_retry = 60
+            retry = 0
+            fake_progress = 90
+            while retry < max_retry:
+                complete_resp = self.api.complete_upload(token, task.preupload_id)
+                try:
+                    completed = False
+                    file_id = None
+                    if isinstance(complete_resp, dict):
+                        data = complete_resp.get("data", {})
+                        completed = data.get("completed") is True
+                        file_id = data.get("fileID", 0)
+                    if completed:
                         task.status = '已完成'
                         task.progress = 100
                         task.completed = True
+                        task.file_id = file_id
                         task.error = ''
+                        task.journal.remove(task.journal_key)
                         break
-                if progress_callback:
-                    progress_callback(task)
-                if status_callback:
-                    status_callback(task)
+                    elif not completed:
+                        task.status = '校验中...'
+                        task.error = '文件正在校验中, 请间隔1秒后再试'
+                        # 校验中进度条递增到99%
+                        if fake_progress < 99:
+                            fake_progress += 1
+                        task.progress = fake_progress
+                        if status_callback:
+                            status_callback(task)
+                        time.sleep(backoff_delay(retry, cap=UPLOAD_VERIFY_POLL_MAX_DELAY))
+                        retry += 1
+                        continue
+                    else:
+                        task.status = '失败'
+                        task.error = complete_resp.get('message', '上传完毕未完成')
+                        break
+                except Exception as e:
+                    task.status = '已完成'
+                    task.progress = 100
+                    task.completed = True
+                    task.error = ''
+                    task.journal.remove(task.journal_key)
+                    break
+            if task.completed:
+                self.record_uploaded(task)
+            if progress_callback:
+                progress_callback(task)
+            if status_callback:
+                status_callback(task)
+        except Exception as e:
+            task.status = '失败'
+            task.error = str(e)
+            if status_callback:
+                status_callback(task)
+
+    def record_uploaded(self, task):
+        """上传完成后作废目标文件夹的本地目录镜像，下次打开时重新列举"""
+        if task.metadata is None:
+            return
+        try:
+            task.metadata.invalidate(task.parent_id)
+        except sqlite3.Error:
+            pass  # 镜像写入失败不影响上传结果，该文件夹到期后仍会在后台重新列举
+
+    def load_file_hashes(self, task):
+        """填充task的文件MD5和分片MD5，未命中缓存时计算并写回缓存"""
+        cached = self.hash_cache.get(task.file_path)
+        if cached:
+            task.file_md5, task.hash_slice_size, task.slice_md5s = cached
+            return
+        st = os.stat(task.file_path)
+        stat_key = (st.st_size, st.st_mtime_ns, st.st_ino)
+        task.file_md5, task.slice_md5s = calc_file_and_slice_md5(task.file_path, UPLOAD_DEFAULT_SLICE_SIZE)
+        task.hash_slice_size = UPLOAD_DEFAULT_SLICE_SIZE
+        self.hash_cache.put(task.file_path, task.file_md5, task.hash_slice_size, task.slice_md5s, stat_key)
+
+    def create_upload(self, task, token):
+        """
+        调用create_file开始一次新的上传并登记断点记录，秒传时直接标记完成
+        :return: 失败时返回错误信息，成功返回None
+        """
+        resp = self.api.create_file(token, task.file_name, task.file_size, task.file_md5, parent_file_id=task.parent_id)
+        if resp["code"] != 0:
+            return resp.get('message', '创建文件失败')
+        data = resp["data"]
+        if data.get("reuse"):
+            task.completed = True
+            return None
+        task.slice_size = data["sliceSize"]
+        task.preupload_id = data["preuploadID"]
+        task.servers = data["servers"]
+        task.done_slices = set()
+        task.journal.begin(task.journal_key, task.file_path, task.file_size, task.file_md5, task.parent_id,
+                           task.preupload_id, task.servers, task.slice_size)
+        return None
+
+    def restore_from_journal(self, task):
+        """从断点记录恢复预上传ID、上传域名和已完成分片，没有记录返回False"""
+        entry = task.journal.get(task.journal_key)
+        if not entry or entry["file_size"] != task.file_size:
+            return False
+        task.preupload_id = entry["preupload_id"]
+        task.servers = entry["servers"]
+        task.slice_size = entry["slice_size"]
+        task.done_slices = set(entry["done_slices"])
+        total = count_slices(task.file_size, task.slice_size)
+        task.progress = round(5 + len(task.done_slices) / total * 95, 1)
+        return True
+
+    def finish_stopped(self, task):
+        """上传线程响应暂停/取消后的收尾"""
+        if task._stop_reason == 'cancel':
+            task.journal.remove(task.journal_key)
+            task.status = '已取消'
+        else:
+            task.status = '已暂停'
+        task.error = ''
+
+    def upload_slices(self, task, token, progress_callback=None):
+        """
+        并发上传分片：最多UPLOAD_SLICE_CONCURRENCY个分片同时在途，按序号轮询分配到所有上传域名，
+        单个分片失败时换下一个域名并指数退避重试；已确认的分片写入断点记录并在续传时跳过
+        :return: 失败时返回错误信息，成功或被暂停/取消返回None
+        """
+        servers = task.servers or []
+        if not servers:
+            return '未获取到上传域名'
+        # 按需读取分片，内存占用不超过 分片大小×在途分片数
+        slices = iter_file_slices(task.file_path, task.slice_size, skip=task.done_slices)
+        total = count_slices(task.file_size, task.slice_size)
+        lock = threading.Lock()
+        state = {'done': len(task.done_slices), 'error': None, 'last_reported': int(task.progress)}
+
+        # 服务端分片大小与预计算时一致则直接复用分片MD5，否则上传时现算
+        cached_md5s = task.slice_md5s if task.hash_slice_size == task.slice_size else []
+
+        def upload_one(idx, chunk):
+            slice_md5 = cached_md5s[idx - 1] if idx <= len(cached_md5s) else calc_bytes_md5(chunk)
+            error = ''
+            for attempt in range(UPLOAD_SLICE_MAX_RETRY):
+                if state['error'] or task._stop_reason:
+                    return
+                server = servers[(idx - 1 + attempt) % len(servers)]
+                try:
+                    with self.net_slots:
+                        resp = self.api.upload_slice(token, task.preupload_id, idx, chunk, slice_md5, server)
+                    if resp.get("code") == 0:
+                        break
+                    error = resp.get('message', '分片上传失败')
+                except Exception as e:
+                    error = str(e)
+                if attempt + 1 < UPLOAD_SLICE_MAX_RETRY:
+                    time.sleep(backoff_delay(attempt, base=UPLOAD_RETRY_BACKOFF))
+            else:
+                with lock:
+                    if not state['error']:
+                        state['error'] = f"分片{idx}上传失败: {error}"
+                return
+            try:
+                task.journal.mark_slice_done(task.journal_key, idx)
             except Exception as e:
-                task.status = '失败'
-                task.error = str(e)
-                if status_callback:
-                    status_callback(task)
-        task.thread = threading.Thread(target=run)
-        task.thread.start()
+                # 断点记录写不进去时不能当作成功，否则续传会漏掉这个分片
+                with lock:
+                    if not state['error']:
+                        state['error'] = f"分片{idx}记录断点失败: {e}"
+                return
+            with lock:
+                task.done_slices.add(idx)
+                state['done'] += 1
+                # 进度从5%~100%
+                progress = 5 + state['done'] / total * 95
+                if int(progress) // 5 > state['last_reported'] // 5 or state['done'] == total:
+                    task.progress = round(progress, 1)
+                    state['last_reported'] = int(progress)
+                    report = True
+                else:
+                    report = False
+            if report and progress_callback:
+                progress_callback(task)
+
+        # 信号量限制在途分片数，避免一次性提交全部分片
+        slots = threading.BoundedSemaphore(UPLOAD_SLICE_CONCURRENCY)
+        slice_iter = iter(slices)
+        with ThreadPoolExecutor(max_workers=UPLOAD_SLICE_CONCURRENCY) as pool:
+            while True:
+                # 先占到空位再读取下一个分片
+                slots.acquire()
+                item = None if state['error'] or task._stop_reason else next(slice_iter, None)
+                if item is None:
+                    slots.release()
+                    break
+                idx, chunk = item
+                future = pool.submit(upload_one, idx, chunk)
+                future.add_done_callback(lambda f: slots.release())
+        task.journal.flush()
+        return state['error']
 
     def start_all_uploads(self, token, progress_callback=None, status_callback=None):
         for task in self.tasks:
@@ -161,14 +411,32 @@ class UploadManager:
                 self.start_upload(task, token, progress_callback, status_callback)
 
     def pause_upload(self, task):
-        pass
+        """暂停上传：在途分片传完后停止，保留断点记录；排队中的任务直接出队"""
+        with self._cond:
+            if task.running:
+                task._stop_reason = 'pause'
+            elif task.status in ('待上传', '排队中'):
+                task.status = '已暂停'
 
-    def resume_upload(self, task):
-        pass
+    def resume_upload(self, task, token, progress_callback=None, status_callback=None):
+        """继续已暂停或失败的上传，从第一个缺失的分片开始"""
+        if task.running or task.status == '排队中':
+            return
+        self.start_upload(task, token, progress_callback, status_callback)
 
     def cancel_upload(self, task):
-        pass
+        """取消上传并删除断点记录"""
+        with self._cond:
+            if task.running:
+                task._stop_reason = 'cancel'
+                return
+            if not task.completed:
+                task.status = '已取消'
+        if task.journal_key:
+            task.journal.remove(task.journal_key)
     
     def clear_tasks(self):
-        """清除所有上传任务"""
+        """清空所有上传任务：取消正在执行的任务并删除断点记录（“清空”按钮使用，切换用户或退出登录用set_user）"""
+        for task in self.tasks:
+            self.cancel_upload(task)
         self.tasks = [] 
\ No newline at end of file